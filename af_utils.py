@@ -1,11 +1,12 @@
-# Packages
+# Packages (colabdesign, jax and pandas are imported when needed, so importing af_utils is fast)
 import os,sys
-from colabdesign.af import mk_af_model
 import argparse
 import glob
+import re
 import yaml
 import numpy as np
-import pandas as pd
+from fasta_utils import iterRecords, countRecords, getKeyAt
+from confidence_store import ConfidenceWriter
 
 # Get arguments
 def getArgs():
@@ -14,11 +15,81 @@ def getArgs():
     parser.add_argument("--output", "-o", type=str)                   # Output Folder
     parser.add_argument("--num_recycles", "-r", type=int)             # Number of recycles (>1)
     parser.add_argument("--use_multimer", "-m", type=str)             # Use multimer
+    parser.add_argument("--models", type=str, default="")             # AF models for ensemble (e.g. 1,2,3)
+    parser.add_argument("--shard", "-s", type=str, default="0/1")     # Shard to process (i/N)
+    parser.add_argument("--merge", action="store_true")               # Merge shard results
+    parser.add_argument("--jax_cache", type=str, default="jax_cache") # Persistent compilation cache ("" to disable)
+    parser.add_argument("--save_confidence", action="store_true")     # Store per residue pLDDT and PAE arrays
     args = parser.parse_args()
-    if args.use_multimer == "False":
-        use_multimer = False
+    use_multimer = args.use_multimer == "True"
     return args, use_multimer
 
+# Parse shard string i/N, returns shard index and number of shards
+def parseShard(shard:str):
+    index, count = [int(x) for x in shard.split("/")]
+    if count < 1 or not 0 <= index < count:
+        raise Exception(f"Invalid shard {shard}, expected i/N with 0 <= i < N")
+    return index, count
+
+# Persistent jax compilation cache statistics of this process
+cache_stats = {"dir":None, "entries":0, "supported":False, "monitored":False, "hits":0, "misses":0, "requests":0}
+
+# Count entries in compilation cache directory
+def countCacheEntries(cache_dir:str):
+    if cache_dir is None or not os.path.exists(cache_dir):
+        return 0
+    return len(os.listdir(cache_dir))
+
+# Use persistent on-disk jax compilation cache (shared between jobs using the same directory)
+def initCompilationCache(cache_dir:str):
+    if cache_dir is None or cache_dir == "":
+        return
+    import jax
+    os.makedirs(cache_dir, exist_ok=True)
+    try:
+        jax.config.update("jax_compilation_cache_dir", cache_dir)
+        jax.config.update("jax_persistent_cache_min_compile_time_secs", 0)
+        cache_stats["supported"] = True
+    except AttributeError:
+        # Older jax versions only use the persistent cache on TPU
+        from jax.experimental.compilation_cache import compilation_cache
+        compilation_cache.initialize_cache(cache_dir)
+        cache_stats["supported"] = jax.default_backend() == "tpu"
+    if not cache_stats["supported"]:
+        print(f"Warning: jax {jax.__version__} does not support the persistent compilation cache on {jax.default_backend()}, every job compiles")
+    # Count cache hits and misses of this process if jax reports them
+    if hasattr(jax, "monitoring") and hasattr(jax.monitoring, "register_event_listener"):
+        def listener(event, **kwargs):
+            if event.endswith("/compilation_cache/cache_hits"):
+                cache_stats["hits"] += 1
+            elif event.endswith("/compilation_cache/cache_misses"):
+                cache_stats["misses"] += 1
+            elif event.endswith("/compilation_cache/compile_requests_use_cache"):
+                cache_stats["requests"] += 1
+        jax.monitoring.register_event_listener(listener)
+        cache_stats["monitored"] = True
+    cache_stats["dir"] = cache_dir
+    cache_stats["entries"] = countCacheEntries(cache_dir)
+    print(f"Using jax compilation cache {cache_dir} ({cache_stats['entries']} entries)")
+
+# Report cache hits and misses of this process, returns misses
+# Without jax monitoring the misses are approximated by the new entries in the cache directory,
+# which also counts entries written by other jobs sharing the directory
+def reportCompilationCache():
+    if cache_stats["dir"] is None:
+        return
+    if not cache_stats["supported"]:
+        print(f"jax compilation cache: not supported by this jax version/backend, nothing was cached ({cache_stats['dir']})")
+        return
+    if cache_stats["monitored"]:
+        misses = cache_stats["misses"]
+        print(f"jax compilation cache: hits={cache_stats['hits']}/{cache_stats['requests']} misses={misses} ({cache_stats['dir']})")
+    else:
+        misses = countCacheEntries(cache_stats["dir"]) - cache_stats["entries"]
+        print(f"jax compilation cache: misses~{misses} (approximate, new entries in the cache directory of all jobs using it) "
+              f"({cache_stats['dir']})")
+    return misses
+
 # Check if results folder exist
 def checkResults(input:str):
     if not os.path.exists(input):
@@ -51,77 +122,155 @@ def get_info(contig):
 
 # Create af model
 def initModel(flags, protocol):
+    from colabdesign.af import mk_af_model
     if protocol == 'partial':
         af_model = mk_af_model(protocol='fixbb',use_templates=True,**flags)
     else:
         af_model = mk_af_model(protocol="fixbb",**flags)
     return af_model
 
-# Run af
-def runAF(af_model, seq, args, outdir, id):
-    # Predict structure
-    af_model.predict(seq=seq, num_recycles=args.num_recycles, verbose=False)
-    # Save pdb file
-    af_model.save_current_pdb(f"{outdir}/{id}.pdb")
-    return af_model.aux["log"]
-
-# Get fasta seq
-def getSeq(path:str):
-    fasta = glob.glob(path)[0]
-    with open(fasta,"r") as f:
-        entries = f.read().splitlines() 
-    return entries
+# Get AF model names, numbers are expanded to ptm/multimer model names
+def getModelNames(models:str, use_multimer:bool):
+    if models is None or models == "":
+        models = "1"
+    model_names = []
+    for model in str(models).split(","):
+        model = model.strip()
+        if model.isnumeric():
+            model = f"model_{model}_multimer_v3" if use_multimer else f"model_{model}_ptm"
+        model_names.append(model)
+    return model_names
+
+# Get metric labels, ensembles get the mean (af term), min and per model values
+def getMetricLabels(af_terms:list, models:list):
+    if len(models) == 1:
+        return list(af_terms)
+    labels = list(af_terms) + [f"{t}_min" for t in af_terms]
+    for model in models:
+        labels += [f"{t}_{model}" for t in af_terms]
+    return labels
+
+# Run af with every model, inputs are prepared once and shared between all models
+# Per residue pLDDT and PAE arrays are written to store (ConfidenceWriter) under key (design, n) if given
+def runAF(af_model, seq, num_recycles, outdir, id, af_terms, models, store=None, key=None):
+    results = {}
+    for model in models:
+        # Predict structure
+        af_model.predict(seq=seq, num_recycles=num_recycles, models=[model], verbose=False)
+        # Save pdb file
+        suffix = "" if len(models) == 1 else f"_{model}"
+        af_model.save_current_pdb(f"{outdir}/{id}{suffix}.pdb")
+        if store is not None:
+            store.add(*key, model, af_model.aux["plddt"], af_model.aux["pae"])
+        for t in af_terms:
+            value = af_model.aux["log"][t]
+            if t in ["pae","i_pae"]:
+                value = value * 31
+            results[f"{t}_{model}"] = value
+    for t in af_terms:
+        values = [results[f"{t}_{model}"] for model in models]
+        results[t] = float(np.mean(values))
+        if len(models) > 1:
+            results[f"{t}_min"] = float(np.min(values))
+    return {k:results[k] for k in getMetricLabels(af_terms, models)}
+
+# Get fasta file
+def getFasta(path:str):
+    return glob.glob(path)[0]
+
+# Get (design, n) work units from fasta records, yields units one by one
+def getUnits(records):
+    for header, seq in records:
+        fields = header.split("|")
+        design_number, seq_number = [int(x.split(":")[-1]) for x in fields[0].split(" ")]
+        score = float(fields[1].split(":")[-1])
+        yield design_number, seq_number, score, seq
+
+# Get contiguous range of records for a shard (split by record count)
+def getShardRange(count:int, index:int, num_shards:int):
+    return count * index // num_shards, count * (index + 1) // num_shards
+
+# Move shard boundary forward to the first record of the next design (keys are "design/n")
+def alignToDesign(fasta:str, position:int, count:int):
+    if position == 0 or position >= count:
+        return position
+    design = getKeyAt(fasta, position - 1).split("/")[0]
+    while position < count and getKeyAt(fasta, position).split("/")[0] == design:
+        position += 1
+    return position
+
+# Get work units of a shard, records are streamed from the indexed fasta file
+# Boundaries are moved to design boundaries, so the sequences of one design are in one shard
+def getShardUnits(fasta:str, index:int, num_shards:int):
+    count = countRecords(fasta)
+    start, stop = [alignToDesign(fasta, x, count) for x in getShardRange(count, index, num_shards)]
+    print(f"Records {start} to {stop}")
+    return getUnits(iterRecords(fasta, start, stop))
+
+# Get results file of a shard
+def getResultsFile(outdir:str, index:int, count:int):
+    if count == 1:
+        return f"{outdir}/mpnn_results.csv"
+    return f"{outdir}/mpnn_results_shard{index}of{count}.csv"
+
+# Remove confidence arrays of earlier runs with another shard count, they would shadow the arrays of this run
+def removeStaleConfidence(path:str, count:int):
+    for file in glob.glob(f"{path}/*shard*of*"):
+        match = re.search(r"shard\d+of(\d+)(?!\d)", os.path.basename(file))
+        if match is not None and int(match.group(1)) != count:
+            try:
+                os.remove(file)
+            except FileNotFoundError:
+                pass    # Removed by another shard
 
 # Repeat AF predictions for RFdiffusion experiment
-def predict(entries:list, args:dict, af_model, exp:str, af_terms:list, prep_flags:dict, outdir:str):
-    print("Number of entries: ", len(entries))
+def predict(units, args:dict, af_model, exp:str, af_terms:list, prep_flags:dict, outdir:str, results_file:str):
+    import pandas as pd
     current_design = -1
-    contig = ""
-    out = {}
     data = []
-    seq_number = 0
-    labels = ["design","n","score"] + af_terms + ["seq"]
-    for i in range(0, len(entries), 2):
-        header = entries[i]
-        seq = entries[i+1]
-        print(header, seq)
-        design_number = int(header.split(" ")[0].split(":")[-1])
-        score = float(header.split("|")[1].split(":")[-1])
-        print("Design Number: ", design_number)
+    models = getModelNames(args.models, args.use_multimer == "True")
+    labels = ["design","n","mpnn"] + getMetricLabels(af_terms, models) + ["seq"]
+    store = None
+    if args.save_confidence:
+        index, count = parseShard(args.shard)
+        removeStaleConfidence(f"{outdir}/confidence", count)
+        store = ConfidenceWriter(f"{outdir}/confidence", prefix=f"shard{index}of{count}")
+    for design_number, seq_number, score, seq in units:
         if design_number != current_design:
-            if seq_number > 0:
-                data += [[out[k][n] for k in labels] for n in range(seq_number+1)]
-            seq_number = 0
-            out['design'] = [design_number]
-            out['n'] = [seq_number]
-            out['seq'] = [seq]
-            out['score'] = [score]
-            for k in af_terms: out[k] = []
             pdb_filename = f"{args.input}/Diffusion/{exp}_{design_number}.pdb"
             af_model.prep_inputs(pdb_filename, **prep_flags)
             current_design = design_number
-        else:
-            seq_number += 1
-            out["design"].append(design_number)
-            out["n"].append(seq_number)
-            out["seq"].append(seq)
-            out["score"].append(score)
-        
+
         id = f"design{design_number}_n{seq_number}"
-        results = runAF(af_model=af_model, seq=seq, args=args, outdir=f"{outdir}/all_pdb", id=id)
-        for t in af_terms: out[t].append(results[t])
-        if "i_pae" in out:
-          out["i_pae"][-1] = out["i_pae"][-1] * 31
-        if "pae" in out:
-          out["pae"][-1] = out["pae"][-1] * 31
-        print("out after", out)
+        out = runAF(af_model=af_model, seq=seq, num_recycles=args.num_recycles, outdir=f"{outdir}/all_pdb",
+                    id=id, af_terms=af_terms, models=models, store=store, key=(design_number, seq_number))
+        out.update({"design":design_number, "n":seq_number, "mpnn":score, "seq":seq})
+        print(id, " ".join([f"{t}:{out[t]:.3f}" for t in af_terms]))
+        data.append([out[k] for k in labels])
         af_model._k += 1
-    print("before: ", data)
-    data += [[out[k][n] for k in labels] for n in range(seq_number+1)]
-    print(data)
-    labels[2] = "mpnn"
+    if store is not None:
+        store.close()
     df = pd.DataFrame(data, columns=labels)
-    df.to_csv(f'{outdir}/mpnn_results.csv')
+    df.to_csv(results_file)
+
+# Merge shard results into one results table (same as single process run)
+def mergeShards(outdir:str):
+    import pandas as pd
+    shards = {}
+    for file in glob.glob(f"{outdir}/mpnn_results_shard*of*.csv"):
+        match = re.search(r"shard(\d+)of(\d+)\.csv$", file)
+        shards[(int(match.group(1)), int(match.group(2)))] = file
+    counts = set([count for _, count in shards])
+    if len(counts) != 1:
+        raise Exception(f"Expected shard results of one run, found shard counts {sorted(counts)}")
+    count = counts.pop()
+    missing = [i for i in range(count) if (i, count) not in shards]
+    if len(missing) > 0:
+        raise Exception(f"Missing shard results: {missing}")
+    df = pd.concat([pd.read_csv(shards[(i, count)], index_col=0, float_precision="round_trip") for i in range(count)],
+                   ignore_index=True)
+    df.to_csv(f"{outdir}/mpnn_results.csv")
+    return df
 
 """
 EXAMPLE
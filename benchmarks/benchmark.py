@@ -0,0 +1,152 @@
+"""
+Benchmark pipeline overhead (startup, contig parsing, pdb rewrites, pdb I/O, fasta/csv writing, slurm scripts)
+with RFdiffusion, ProteinMPNN and AlphaFold replaced by deterministic CPU stubs.
+"""
+
+# Packages
+import os, sys, time, json, random, argparse, tempfile, contextlib, subprocess
+import yaml
+from argparse import Namespace
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+import stubs
+import diffuse
+import designability_test
+import af_utils
+import run_cluster
+
+"""
+Arguments
+--scales, type=str                      # Comma separated numbers of designs, default 10,100,1000 (up to 100000)
+--length, type=int                      # Length of synthetic designs, default 100
+--num_seqs, type=int                    # Number of sequences per design, default 2
+--baseline, type=str                    # Baseline file, default benchmarks/baseline.json
+--save_baseline                         # Store results as new baseline
+--tolerance, type=float                 # Allowed slowdown relative to baseline, default 0.2
+--output, type=str                      # Write results to json file
+"""
+
+# Startup of the validation entry points in a fresh interpreter (--help and config dry run)
+def bench_startup(workdir, num_designs, length, num_seqs):
+    config = f"{workdir}/startup.yml"
+    with open(config, "w") as handle:
+        yaml.dump({"diffusion":{"name":"bench", "path":f"{workdir}/", "contigs":f"{length}-{length}", "num_designs":num_designs},
+                   "validation":{"num_seqs":num_seqs, "num_recycles":1, "initial_guess":False, "use_multimer":False,
+                                 "rm_aa":"C"}}, handle)
+    for command in [["designability_test.py", "--help"], ["validate.py", "--config", config, "--dry_run"]]:
+        subprocess.run([sys.executable] + command, cwd=root, check=True, stdout=subprocess.DEVNULL)
+
+# Parse random contigs (same layout as experiment configs)
+def bench_contigs(workdir, num_designs, length, num_seqs):
+    rng = random.Random(0)
+    for n in range(num_designs):
+        contig = f"{rng.randint(20,40)}-40/A130-130/{rng.randint(10,25)}-25/A176-176/{rng.randint(10,25)}-25"
+        contigs = designability_test.get_contigs(contig)
+        designability_test.get_protocol(contigs)
+
+# Diffusion incl. fix_pdb post-processing
+def bench_diffusion(workdir, num_designs, length, num_seqs):
+    diffuse.run_diffusion(type="base", contigs=f"{length}-{length}", name="bench", path=f"{workdir}/",
+                          num_designs=num_designs)
+
+# Validation (ProteinMPNN + AF), pdb I/O, fasta and csv writing
+def bench_validation(workdir, num_designs, length, num_seqs):
+    designability_test.main([f"--pdb={workdir}/bench/Diffusion/bench_0.pdb",
+                             f"--loc={workdir}/bench/Validation",
+                             f"--contigs={length}-{length}",
+                             f"--num_seqs={num_seqs}",
+                             f"--num_designs={num_designs}",
+                             "--num_recycles=1",
+                             "--jax_cache="])
+
+# Re-validation of the validation fasta
+def bench_revalidation(workdir, num_designs, length, num_seqs):
+    args = Namespace(input=f"{workdir}/bench", num_recycles=1, models="", use_multimer="False", save_confidence=False)
+    outdir = f"{workdir}/bench/Revalidation"
+    os.makedirs(f"{outdir}/all_pdb", exist_ok=True)
+    fasta = af_utils.getFasta(f"{args.input}/Validation/*.fasta")
+    units = af_utils.getShardUnits(fasta, 0, 1)
+    af_utils.predict(units=units, args=args, af_model=stubs.StubAfModel(), exp="bench", af_terms=["plddt","ptm","pae","rmsd"],
+                     prep_flags={}, outdir=outdir, results_file=f"{outdir}/mpnn_results.csv")
+
+# Slurm script generation
+def bench_slurm(workdir, num_designs, length, num_seqs):
+    slurm_path = f"{workdir}/Slurm"
+    os.makedirs(slurm_path, exist_ok=True)
+    for n in range(num_designs):
+        run_cluster.create_slurm_script(colabdesign_path=workdir, slurm_path=slurm_path, container="container.sif",
+                                        config=f"{workdir}/Configs/bench_{n}.yml", script="python3 validate.py",
+                                        outdir=slurm_path, name=f"bench_{n}_validation", jobname=f"val-bench_{n}",
+                                        dependency=str(n))
+
+stages = {"startup":bench_startup,
+          "contigs":bench_contigs,
+          "diffusion":bench_diffusion,
+          "validation":bench_validation,
+          "revalidation":bench_revalidation,
+          "slurm":bench_slurm}
+
+# Run all stages for one scale, returns seconds per stage
+def run_scale(num_designs, length, num_seqs):
+    times = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for stage,func in stages.items():
+            start = time.perf_counter()
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                func(workdir, num_designs, length, num_seqs)
+            times[stage] = time.perf_counter() - start
+    return times
+
+# Compare results with baseline, returns list of regressions
+def compare(results, baseline, tolerance, min_delta=0.05):
+    regressions = []
+    for stage,scales in results.items():
+        for scale,seconds in scales.items():
+            reference = baseline.get(stage, {}).get(scale)
+            if reference is None:
+                continue
+            if seconds > reference * (1 + tolerance) and seconds - reference > min_delta:
+                regressions.append((stage, scale, reference, seconds))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", type=str, default="10,100,1000")
+    parser.add_argument("--length", type=int, default=100)
+    parser.add_argument("--num_seqs", type=int, default=2)
+    parser.add_argument("--baseline", type=str, default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json"))
+    parser.add_argument("--save_baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--output", type=str, default="")
+    args = parser.parse_args()
+
+    stubs.install_rfdiffusion_stub()
+    stubs.install_model_stubs(designability_test=designability_test, diffuse=diffuse, length=args.length)
+
+    # Run benchmark
+    results = {stage:{} for stage in stages}
+    for scale in [int(x) for x in args.scales.split(",")]:
+        times = run_scale(scale, args.length, args.num_seqs)
+        for stage,seconds in times.items():
+            results[stage][str(scale)] = seconds
+        print(f"designs={scale} " + " ".join([f"{stage}:{seconds:.3f}s" for stage,seconds in times.items()]))
+
+    if args.output != "":
+        with open(args.output, "w") as handle:
+            json.dump(results, handle, indent=2)
+
+    # Store or compare baseline
+    if args.save_baseline:
+        with open(args.baseline, "w") as handle:
+            json.dump(results, handle, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        regressions = compare(results, baseline, args.tolerance)
+        for stage,scale,reference,seconds in regressions:
+            print(f"REGRESSION {stage} designs={scale}: {reference:.3f}s -> {seconds:.3f}s")
+        if len(regressions) > 0:
+            sys.exit(1)
+        print("No regressions against baseline")
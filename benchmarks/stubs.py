@@ -0,0 +1,125 @@
+"""
+Deterministic CPU stand-ins for RFdiffusion, ProteinMPNN and AlphaFold.
+They keep the interfaces used by diffuse.py, designability_test.py and af_utils.py,
+so the pipeline code around the models runs unchanged without a GPU.
+"""
+
+# Packages
+import os, sys, re, types, zlib
+import numpy as np
+
+alphabet = list("ACDEFGHIKLMNPQRSTVWY")
+
+# Create synthetic backbone pdb string (N, CA, C, O per residue)
+def synthetic_pdb(length:int, chain:str="A", seed:int=0):
+    rng = np.random.default_rng(seed)
+    ca = np.cumsum(rng.normal(0, 1, (length, 3)) + [3.8, 0, 0], axis=0)
+    lines = []
+    atom = 1
+    for i in range(length):
+        for name,offset in [("N",-0.5),("CA",0.0),("C",0.5),("O",1.0)]:
+            x, y, z = ca[i] + offset
+            lines.append("ATOM  %5d  %-3s GLY %s%4d    %8.3f%8.3f%8.3f  1.00  0.00           %s"
+                         % (atom, name, chain, i + 1, x, y, z, name[0]))
+            atom += 1
+    lines += ["TER", "END"]
+    return "\n".join(lines) + "\n"
+
+# Get residue ids (chain, resnum) of a pdb string
+def get_pdb_idx(pdb_str:str):
+    return [(line[21], int(line[22:26])) for line in pdb_str.splitlines()
+            if line[:4] == "ATOM" and line[12:16].strip() == "CA"]
+
+# Stub for rfdiffusion.inference.utils (parse_pdb is imported by diffuse.run_diffusion)
+def install_rfdiffusion_stub():
+    def parse_pdb(filename, **kwargs):
+        with open(filename) as handle:
+            return {"pdb_idx": get_pdb_idx(handle.read())}
+    utils = types.ModuleType("rfdiffusion.inference.utils")
+    utils.parse_pdb = parse_pdb
+    inference = types.ModuleType("rfdiffusion.inference")
+    inference.utils = utils
+    rfdiffusion = types.ModuleType("rfdiffusion")
+    rfdiffusion.inference = inference
+    sys.modules.update({"rfdiffusion":rfdiffusion,
+                        "rfdiffusion.inference":inference,
+                        "rfdiffusion.inference.utils":utils})
+
+# Stub for diffuse.run, writes synthetic designs and trajectories instead of running RFdiffusion
+def make_diffusion_stub(length:int):
+    pdb_str = synthetic_pdb(length)
+    def run(command, **kwargs):
+        opts = dict(re.findall(r"(inference\.\w+)=(\S+)", command))
+        prefix = opts["inference.output_prefix"]
+        name = os.path.basename(prefix)
+        folder = os.path.dirname(prefix)
+        os.makedirs(f"{folder}/traj", exist_ok=True)
+        for n in range(int(opts["inference.num_designs"])):
+            for pdb in [f"{folder}/traj/{name}_{n}_pX0_traj.pdb",
+                        f"{folder}/traj/{name}_{n}_Xt-1_traj.pdb",
+                        f"{prefix}_{n}.pdb"]:
+                with open(pdb, "w") as handle:
+                    handle.write(pdb_str)
+        return 0
+    return run
+
+# Stub for colabdesign af model
+class StubAfModel:
+    def __init__(self, protocol="fixbb", **kwargs):
+        self.protocol = protocol
+        self.opt = {}
+        self.aux = {"log":{}}
+        self._k = 0
+        self._len = 0
+        self._pdb_str = ""
+
+    def prep_inputs(self, pdb_filename=None, **kwargs):
+        with open(pdb_filename) as handle:
+            self._pdb_str = handle.read()
+        self._len = len(get_pdb_idx(self._pdb_str))
+
+    def predict(self, seq=None, num_recycles=0, models=None, verbose=True, **kwargs):
+        rng = np.random.default_rng(zlib.crc32(f"{seq}{models}".encode()))
+        plddt, ptm, pae = rng.uniform(0.4, 1.0, 3)
+        self.aux = {"log":{"plddt":plddt, "ptm":ptm, "i_ptm":ptm, "pae":pae / 10, "i_pae":pae / 10,
+                           "rmsd":rng.uniform(0.5, 5.0)},
+                    "plddt":rng.uniform(0.4, 1.0, self._len), "pae":rng.uniform(0.0, 31.0, (self._len, self._len))}
+
+    def save_current_pdb(self, filename):
+        with open(filename, "w") as handle:
+            handle.write(self._pdb_str)
+
+    def save_pdb(self, filename):
+        self.save_current_pdb(filename)
+
+    def _save_results(self, **kwargs):
+        pass
+
+# Stub for colabdesign mpnn model
+class StubMpnnModel:
+    def __init__(self, weights="original", **kwargs):
+        self._len = 0
+        self._calls = 0
+
+    def get_af_inputs(self, af_model):
+        self._len = af_model._len
+
+    def sample(self, num=1, batch=1, temperature=0.1, **kwargs):
+        rng = np.random.default_rng(self._calls)
+        self._calls += 1
+        seqs = ["".join(rng.choice(alphabet, self._len)) for _ in range(num * batch)]
+        return {"seq":seqs, "score":rng.uniform(0.8, 1.6, num * batch)}
+
+# Stub for designability_test.sample_batch (batched multi-temperature sampling)
+def sample_batch(mpnn_model, batch_size, temperatures):
+    samples = [mpnn_model.sample(num=1, batch=batch_size, temperature=t) for t in temperatures]
+    return {k:np.concatenate([x[k] for x in samples]) for k in ["seq", "score"]}
+
+# Replace models used by the pipeline modules with stubs
+def install_model_stubs(designability_test=None, diffuse=None, length=100):
+    if designability_test is not None:
+        designability_test.mk_af_model = StubAfModel
+        designability_test.mk_mpnn_model = StubMpnnModel
+        designability_test.sample_batch = sample_batch
+    if diffuse is not None:
+        diffuse.run = make_diffusion_stub(length)
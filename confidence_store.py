@@ -0,0 +1,102 @@
+# Packages
+import os, glob, csv
+from collections import OrderedDict
+import numpy as np
+
+"""
+Store of per-residue pLDDT and PAE matrices of AF predictions
+Arrays are stored as float16 in compressed npz chunks (chunk_size predictions per file), every writer (process, shard)
+uses its own prefix and index file (index_<prefix>.csv with design, n, model, length and chunk file).
+Arrays are only decompressed when they are accessed, so single predictions can be read from large stores.
+
+Example
+with ConfidenceStore("Validation/confidence") as store:
+    plddt = store.plddt(design=3, n=1)              # per residue pLDDT
+    pae = store.pae(design=3, n=1)[:50, 50:]        # PAE between residues 0-49 and 50-
+"""
+
+index_labels = ["design", "n", "model", "length", "file"]
+
+# Writes predictions to chunk files of one writer
+class ConfidenceWriter:
+    def __init__(self, path:str, prefix:str="store", chunk_size:int=64):
+        self.path = path
+        self.prefix = prefix
+        self.chunk_size = chunk_size
+        self.chunk = 0
+        self.arrays = {}
+        self.rows = []
+        os.makedirs(path, exist_ok=True)
+        # Remove results of a previous run of the same writer
+        for file in glob.glob(f"{path}/{prefix}_*.npz"):
+            os.remove(file)
+        with open(f"{path}/index_{prefix}.csv", "w") as f:
+            csv.writer(f).writerow(index_labels)
+
+    def add(self, design:int, n:int, model:str, plddt, pae):
+        key = f"{design}_{n}_{model}"
+        self.arrays[f"{key}_plddt"] = np.asarray(plddt, dtype=np.float16)
+        self.arrays[f"{key}_pae"] = np.asarray(pae, dtype=np.float16)
+        self.rows.append([design, n, model, len(plddt), f"{self.prefix}_{self.chunk:05d}.npz"])
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if len(self.rows) == 0:
+            return
+        np.savez_compressed(f"{self.path}/{self.prefix}_{self.chunk:05d}.npz", **self.arrays)
+        with open(f"{self.path}/index_{self.prefix}.csv", "a") as f:
+            csv.writer(f).writerows(self.rows)
+        self.chunk += 1
+        self.arrays = {}
+        self.rows = []
+
+    def close(self):
+        self.flush()
+
+# Reads predictions of all writers lazily, at most max_open chunk files are kept open
+class ConfidenceStore:
+    def __init__(self, path:str, max_open:int=8):
+        self.path = path
+        self.index = {}
+        for index_file in sorted(glob.glob(f"{path}/index_*.csv")):
+            with open(index_file) as f:
+                for row in csv.DictReader(f):
+                    self.index[(int(row["design"]), int(row["n"]), row["model"])] = (int(row["length"]), row["file"])
+        self.max_open = max_open
+        self.files = OrderedDict()
+
+    def keys(self):
+        return list(self.index.keys())
+
+    def models(self, design:int, n:int):
+        return [m for d, s, m in self.index if d == design and s == n]
+
+    def load(self, design:int, n:int, model:str=None, array:str="plddt"):
+        if model is None:
+            model = self.models(design, n)[0]
+        length, file = self.index[(design, n, model)]
+        if file in self.files:
+            self.files.move_to_end(file)
+        else:
+            if len(self.files) >= self.max_open:
+                self.files.popitem(last=False)[1].close()
+            self.files[file] = np.load(f"{self.path}/{file}")
+        return self.files[file][f"{design}_{n}_{model}_{array}"]
+
+    def plddt(self, design:int, n:int, model:str=None):
+        return self.load(design, n, model, "plddt")
+
+    def pae(self, design:int, n:int, model:str=None):
+        return self.load(design, n, model, "pae")
+
+    def close(self):
+        for npz in self.files.values():
+            npz.close()
+        self.files.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
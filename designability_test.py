@@ -1,15 +1,70 @@
 import os,sys
+import argparse
+import multiprocessing
+from dataclasses import dataclass, field, fields, asdict, replace
 
-from colabdesign.mpnn import mk_mpnn_model
-from colabdesign.af import mk_af_model
-from colabdesign.shared.protein import pdb_to_string
-from colabdesign.shared.parse_args import parse_args
+from af_utils import getModelNames, getMetricLabels, runAF, initCompilationCache, reportCompilationCache
+from confidence_store import ConfidenceWriter
+from seq_filter import filter_sequences
 
-import pandas as pd
 import numpy as np
 from string import ascii_uppercase, ascii_lowercase
 alphabet_list = list(ascii_uppercase+ascii_lowercase)
 
+# colabdesign (and jax) is imported on first use, so --help and option checks do not load it
+mk_af_model = None
+mk_mpnn_model = None
+
+def import_models():
+  global mk_af_model, mk_mpnn_model
+  if mk_af_model is None:
+    from colabdesign.af import mk_af_model
+  if mk_mpnn_model is None:
+    from colabdesign.mpnn import mk_mpnn_model
+
+def option(default, help):
+  return field(default=default, metadata={"help":help})
+
+@dataclass
+class DesignabilityOptions:
+  # required
+  pdb: str = option(None, "input pdb")
+  loc: str = option(None, "location to save results")
+  contigs: str = option(None, "contig definition")
+  # optional
+  copies: int = option(1, "number of repeating copies")
+  num_seqs: int = option(8, "number of mpnn designs to evaluate")
+  initial_guess: bool = option(False, "initialize previous coordinates")
+  use_multimer: bool = option(False, "use alphafold_multimer_v3")
+  use_soluble: bool = option(False, "use solubleMPNN")
+  num_recycles: int = option(3, "number of recycles")
+  rm_aa: str = option("C", "disable specific amino acids from being sampled")
+  num_designs: int = option(1, "number of designs to evaluate")
+  mpnn_sampling_temp: float = option(0.1, "sampling temperature used by proteinMPNN")
+  mpnn_sampling_temps: str = option("", "temperature sweep, e.g. 0.1,0.2,0.3 (num_seqs per temperature, overrides mpnn_sampling_temp)")
+  models: str = option("", "AF models to evaluate per sequence, e.g. 1,2,3 (default: model 1)")
+  jax_cache: str = option("jax_cache", "persistent jax compilation cache directory (empty to disable)")
+  workers: int = option(1, "number of AlphaFold workers (0: one per visible GPU or cpu slot)")
+  save_confidence: bool = option(False, "store per residue pLDDT and PAE arrays in loc/confidence")
+  # sequence prefilter before AlphaFold (0 disables a rule)
+  filter_max_score: float = option(0, "prefilter: max mpnn score")
+  filter_max_aa_fraction: float = option(0, "prefilter: max fraction of a single amino acid")
+  filter_max_repeat: int = option(0, "prefilter: max homopolymer run length")
+  filter_min_entropy: float = option(0, "prefilter: min sequence entropy (bits) in every window (low complexity)")
+  filter_entropy_window: int = option(12, "prefilter: window size of the low complexity rule")
+  filter_max_hydrophobic_run: int = option(0, "prefilter: max number of consecutive hydrophobic residues")
+  filter_top_k: int = option(0, "prefilter: number of best passing sequences by mpnn score per design")
+
+def get_parser():
+  parser = argparse.ArgumentParser(description="Designability Test (ProteinMPNN + AlphaFold)")
+  for f in fields(DesignabilityOptions):
+    if f.type is bool:
+      parser.add_argument(f"--{f.name}", action="store_true", help=f.metadata["help"])
+    else:
+      parser.add_argument(f"--{f.name}", type=f.type, default=f.default, required=f.default is None,
+                          help=f.metadata["help"])
+  return parser
+
 def get_info(contig):
   F = []
   free_chain = False
@@ -26,46 +81,18 @@ def get_info(contig):
       free_chain = True
   return F,[fixed_chain,free_chain]
 
-def main(argv):
-  ag = parse_args()
-  ag.txt("-------------------------------------------------------------------------------------")
-  ag.txt("Designability Test")
-  ag.txt("-------------------------------------------------------------------------------------")
-  ag.txt("REQUIRED")
-  ag.txt("-------------------------------------------------------------------------------------")
-  ag.add(["pdb="          ],  None,   str, ["input pdb"])
-  ag.add(["loc="          ],  None,   str, ["location to save results"])
-  ag.add(["contigs="      ],  None,   str, ["contig definition"])
-  ag.txt("-------------------------------------------------------------------------------------")
-  ag.txt("OPTIONAL")
-  ag.txt("-------------------------------------------------------------------------------------")
-  ag.add(["copies="       ],         1,    int, ["number of repeating copies"])
-  ag.add(["num_seqs="     ],         8,    int, ["number of mpnn designs to evaluate"])
-  ag.add(["initial_guess" ],     False,   None, ["initialize previous coordinates"])
-  ag.add(["use_multimer"  ],     False,   None, ["use alphafold_multimer_v3"])
-  ag.add(["use_soluble"   ],     False,   None, ["use solubleMPNN"])
-  ag.add(["num_recycles=" ],         3,    int, ["number of recycles"])
-  ag.add(["rm_aa="],               "C",    str, ["disable specific amino acids from being sampled"])
-  ag.add(["num_designs="  ],         1,    int, ["number of designs to evaluate"])
-  ag.add(["mpnn_sampling_temp=" ], 0.1,  float, ["sampling temperature used by proteinMPNN"])
-  ag.txt("-------------------------------------------------------------------------------------")
-  o = ag.parse(argv)
-
-  if None in [o.pdb, o.loc, o.contigs]:
-    ag.usage("Missing Required Arguments")
-
-  if o.rm_aa == "":
-    o.rm_aa = None
-
+def get_contigs(contigs_str):
   # filter contig input
   contigs = []
-  for contig_str in o.contigs.replace(" ",":").replace(",",":").split(":"):
+  for contig_str in contigs_str.replace(" ",":").replace(",",":").split(":"):
     if len(contig_str) > 0:
       contig = []
       for x in contig_str.split("/"):
         if x != "0": contig.append(x)
       contigs.append("/".join(contig))
+  return contigs
 
+def get_protocol(contigs):
   chains = alphabet_list[:len(contigs)]
   info = [get_info(x) for x in contigs]
   fixed_pos = []
@@ -78,14 +105,33 @@ def main(argv):
     free_chains += [free_chain and not fixed_chain]
     both_chains += [fixed_chain and free_chain]
 
+  if sum(both_chains) == 0 and sum(fixed_chains) > 0 and sum(free_chains) > 0:
+    protocol = "binder"
+  elif sum(fixed_pos) > 0:
+    protocol = "partial"
+  else:
+    protocol = "fixbb"
+  return protocol, chains, fixed_chains, fixed_pos
+
+def get_af_terms(protocol, copies):
+  if protocol == "binder":
+    return ["plddt","i_ptm","i_pae","rmsd"]
+  elif copies > 1:
+    return ["plddt","ptm","i_ptm","pae","i_pae","rmsd"]
+  else:
+    return ["plddt","ptm","pae","rmsd"]
+
+def setup_af_model(o, contigs):
+  import_models()
+  protocol, chains, fixed_chains, fixed_pos = get_protocol(contigs)
+  models = getModelNames(o.models, o.use_multimer)
   flags = {"initial_guess":o.initial_guess,
            "best_metric":"rmsd",
            "use_multimer":o.use_multimer,
-           "model_names":["model_1_multimer_v3" if o.use_multimer else "model_1_ptm"]}
+           "model_names":models}
 
-  if sum(both_chains) == 0 and sum(fixed_chains) > 0 and sum(free_chains) > 0:
-    protocol = "binder"
-    print("protocol=binder")
+  print(f"protocol={protocol}")
+  if protocol == "binder":
     target_chains = []
     binder_chains = []
     for n,x in enumerate(fixed_chains):
@@ -95,11 +141,8 @@ def main(argv):
     prep_flags = {"target_chain":",".join(target_chains),
                   "binder_chain":",".join(binder_chains),
                   "rm_aa":o.rm_aa}
-    opt_extra = {}
   
-  elif sum(fixed_pos) > 0:
-    protocol = "partial"
-    print("protocol=partial")
+  elif protocol == "partial":
     af_model = mk_af_model(protocol="fixbb",
                            use_templates=True,
                            **flags)
@@ -111,23 +154,202 @@ def main(argv):
                   "homooligomer":o.copies>1,
                   "rm_aa":o.rm_aa}
   else:
-    protocol = "fixbb"
-    print("protocol=fixbb")
     af_model = mk_af_model(protocol="fixbb",**flags)
     prep_flags = {"chain":",".join(chains),
                   "copies":o.copies,
                   "homooligomer":o.copies>1,
                   "rm_aa":o.rm_aa}
+  return protocol, af_model, prep_flags, fixed_pos, models
+
+def get_temperatures(o):
+  if o.mpnn_sampling_temps == "":
+    return [o.mpnn_sampling_temp]
+  return [float(t) for t in str(o.mpnn_sampling_temps).split(",")]
+
+def sample_batch(mpnn_model, batch_size, temperatures):
+  # batch_size sequences at every temperature in one call vmapped over (key, temperature),
+  # the encoder only depends on the backbone, so jax keeps it unbatched and computes it once per call
+  import jax
+  tied = mpnn_model._tied_lengths
+  if not hasattr(mpnn_model, "_sample_temperatures"):
+    mpnn_model._sample_temperatures = {}
+  if tied not in mpnn_model._sample_temperatures:
+    def sample(key, temperature, inputs):
+      return mpnn_model._sample(**inputs, key=key, temperature=temperature, tied_lengths=tied)
+    mpnn_model._sample_temperatures[tied] = jax.jit(jax.vmap(sample, in_axes=[0,0,None]))
+  I = dict(mpnn_model._inputs)
+  I.pop("temperature", None)
+  I.pop("key", None)
+  keys = jax.random.split(mpnn_model.key(), batch_size * len(temperatures))
+  temps = np.repeat(np.asarray(temperatures, dtype=np.float32), batch_size)
+  O = jax.tree_util.tree_map(np.array, mpnn_model._sample_temperatures[tied](keys, temps, I))
+  O.update(mpnn_model._get_seq(O))
+  O.update(mpnn_model._get_score(I, O))
+  return O
+
+def sample_temperatures(mpnn_model, num_seqs, batch_size, temperatures):
+  # num_seqs sequences per temperature, ordered by temperature (the last batch is cut to num_seqs)
+  chunks = [sample_batch(mpnn_model, batch_size, temperatures) for _ in range(-(-num_seqs//batch_size))]
+  def arrange(k):
+    return np.concatenate([c[k].reshape(len(temperatures), -1) for c in chunks], axis=1)[:, :num_seqs].reshape(-1)
+  return {"seq":arrange("seq"),
+          "score":arrange("score"),
+          "temperature":np.repeat(temperatures, num_seqs)}
+
+def get_filter_rules(o):
+  return {f.name[len("filter_"):]:getattr(o, f.name) for f in fields(o) if f.name.startswith("filter_")}
+
+def prefilter(o, outs, lengths):
+  # select sequences of every design for AlphaFold, rejected sequences are written to loc/prefilter_rejected.csv
+  import pandas as pd
+  rules = get_filter_rules(o)
+  selected = []
+  rejected = []
+  for m,(out,L) in enumerate(zip(outs,lengths)):
+    sub_seqs = [seq.replace("/","")[-L:] for seq in out["seq"]]
+    passed, reasons = filter_sequences(sub_seqs, out["score"], **rules)
+    selected.append(passed)
+    rejected += [[m, n, out["score"][n], out["temperature"][n], reason, out["seq"][n]]
+                 for n,reason in enumerate(reasons) if reason != ""]
+  total = sum([len(out["seq"]) for out in outs])
+  counts = {}
+  for row in rejected:
+    for rule in set([x.split(":")[0] for x in row[4].split("; ")]):
+      counts[rule] = counts.get(rule, 0) + 1
+  print(f"prefilter: {total - len(rejected)}/{total} sequences passed " +
+        " ".join([f"{rule}:{count}" for rule,count in sorted(counts.items())]))
+  df = pd.DataFrame(rejected, columns=["design","n","mpnn","temperature","reason","seq"])
+  df.to_csv(f"{o.loc}/prefilter_rejected.csv")
+  return selected
+
+def get_score_line(m, n, score, results, af_terms):
+  score_line = [f'design:{m} n:{n}',f'mpnn:{score:.3f}']
+  for t in af_terms:
+    score_line.append(f'{t}:{results[t]:.3f}')
+  return score_line
+
+def save_best_design(loc, m, rows, models):
+  # best sequence of design m by rmsd (mean over models), its structure is the prediction of the model with the lowest rmsd
+  # rows are (n, results) of runAF, returns n and rmsd of the best sequence
+  n, results = min(rows, key=lambda x: x[1]["rmsd"])
+  suffix = "" if len(models) == 1 else "_" + min(models, key=lambda x: results[f"rmsd_{x}"])
+  os.system(f"cp {loc}/all_pdb/design{m}_n{n}{suffix}.pdb {loc}/best_design{m}.pdb")
+  return n, results["rmsd"]
+
+def get_worker_devices(workers):
+  # one worker per visible GPU, otherwise one per cpu slot
+  import jax
+  gpus = [d for d in jax.devices() if d.platform == "gpu"]
+  if len(gpus) > 0:
+    visible = os.environ.get("CUDA_VISIBLE_DEVICES", "")
+    devices = visible.split(",") if len(visible) > 0 else [str(d.id) for d in gpus]
+    return devices if workers == 0 else devices[:workers]
+  if workers == 0:
+    workers = int(os.environ.get("SLURM_CPUS_PER_TASK", 1))
+  return [None] * workers
+
+def af_worker(options, contigs, af_terms, tasks, results, worker):
+  # AF worker, takes (design, sequence) units from the shared queue until it gets None
+  o = DesignabilityOptions(**options)
+  initCompilationCache(o.jax_cache)
+  protocol, af_model, prep_flags, fixed_pos, models = setup_af_model(o, contigs)
+  store = ConfidenceWriter(f"{o.loc}/confidence", prefix=f"worker{worker}") if o.save_confidence else None
+  current = None
+  try:
+    for m, n, pdb_filename, seq in iter(tasks.get, None):
+      if pdb_filename != current:
+        af_model.prep_inputs(pdb_filename, **prep_flags)
+        current = pdb_filename
+      out = runAF(af_model, seq, num_recycles=o.num_recycles, outdir=f"{o.loc}/all_pdb",
+                  id=f"design{m}_n{n}", af_terms=af_terms, models=models, store=store, key=(m, n))
+      af_model._k += 1
+      results.put((m, n, out))
+    if store is not None:
+      store.close()
+  except Exception as e:
+    results.put((None, None, repr(e)))
+
+def get_result(results, processes, poll=10):
+  # wait for the next result, fails as soon as a worker died (e.g. killed by the OOM killer or a CUDA abort)
+  import queue
+  while True:
+    try:
+      return results.get(timeout=poll)
+    except queue.Empty:
+      dead = [p for p in processes if p.exitcode not in [None, 0]]
+      if len(dead) > 0 or all([p.exitcode is not None for p in processes]):
+        for process in processes: process.terminate()
+        codes = [p.exitcode for p in processes]
+        raise Exception(f"AlphaFold worker died without result (exit codes {codes})")
+
+def run_af_pool(o, contigs, units, af_terms, models, workers, fasta):
+  # distribute (design, sequence) units dynamically over workers, results are written in (design, n) order
+  devices = get_worker_devices(workers)
+  print(f"starting {len(devices)} AlphaFold workers...")
+  ctx = multiprocessing.get_context("spawn")
+  tasks = ctx.Queue()
+  results = ctx.Queue()
+  for unit in units:
+    tasks.put(unit[:4])
+  processes = []
+  visible = os.environ.get("CUDA_VISIBLE_DEVICES")
+  for worker, device in enumerate(devices):
+    if device is not None:
+      os.environ["CUDA_VISIBLE_DEVICES"] = device
+    tasks.put(None)
+    process = ctx.Process(target=af_worker, args=(asdict(o), contigs, af_terms, tasks, results, worker))
+    process.start()
+    processes.append(process)
+  if visible is None:
+    os.environ.pop("CUDA_VISIBLE_DEVICES", None)
+  else:
+    os.environ["CUDA_VISIBLE_DEVICES"] = visible
+
+  order = {(m,n):i for i,(m,n,_,_,_,_) in enumerate(units)}
+  done = {}
+  next_unit = 0
+  for _ in range(len(units)):
+    m, n, out = get_result(results, processes)
+    if m is None:
+      for process in processes: process.terminate()
+      raise Exception(f"AlphaFold worker failed: {out}")
+    done[order[(m,n)]] = out
+    # stream results in order
+    while next_unit in done:
+      m, n, _, _, score, seq = units[next_unit]
+      score_line = get_score_line(m, n, score, done[next_unit], af_terms)
+      print(" ".join(score_line)+" "+seq)
+      fasta.write(f'>{"|".join(score_line)}\n{seq}\n')
+      fasta.flush()
+      next_unit += 1
+  for process in processes:
+    process.join()
+  return [done[i] for i in range(len(units))]
+
+def run_designability(o:DesignabilityOptions):
+  # ProteinMPNN sequences for every design followed by AlphaFold, results are written to o.loc
+  import pandas as pd
+  if o.rm_aa == "":
+    o = replace(o, rm_aa=None)
+
+  if o.workers != 1:
+    # workers share the GPUs with this process
+    os.environ["XLA_PYTHON_CLIENT_PREALLOCATE"] = "false"
+  initCompilationCache(o.jax_cache)
+  contigs = get_contigs(o.contigs)
+  protocol, af_model, prep_flags, fixed_pos, models = setup_af_model(o, contigs)
 
   batch_size = 8
   if o.num_seqs < batch_size:    
     batch_size = o.num_seqs
   
   print("running proteinMPNN...")
-  sampling_temp = 0.1
+  temperatures = get_temperatures(o)
+  print(f"sampling temperatures={temperatures}")
   mpnn_model = mk_mpnn_model(weights="soluble" if o.use_soluble else "original")
   outs = []
   pdbs = []
+  lengths = []
   for m in range(o.num_designs):
     if o.num_designs == 0:
       pdb_filename = o.pdb
@@ -139,61 +361,87 @@ def main(argv):
       p = np.where(fixed_pos)[0]
       af_model.opt["fix_pos"] = p[p < af_model._len]
 
+    lengths.append(af_model._len)
     mpnn_model.get_af_inputs(af_model)
-    outs.append(mpnn_model.sample(num=o.num_seqs//batch_size, batch=batch_size, temperature=sampling_temp))
+    outs.append(sample_temperatures(mpnn_model, o.num_seqs, batch_size, temperatures))
 
-  if protocol == "binder":
-    af_terms = ["plddt","i_ptm","i_pae","rmsd"]
-  elif o.copies > 1:
-    af_terms = ["plddt","ptm","i_ptm","pae","i_pae","rmsd"]
-  else:
-    af_terms = ["plddt","ptm","pae","rmsd"]
+  af_terms = get_af_terms(protocol, o.copies)
 
-  labels = ["design","n","score"] + af_terms + ["seq"]
+  metric_labels = getMetricLabels(af_terms, models)
+  labels = ["design","n","score","temperature"] + metric_labels + ["seq"]
   data = []
   best = {"rmsd":np.inf,"design":0,"n":0}
-  print("running AlphaFold...")
   os.system(f"mkdir -p {o.loc}/all_pdb")
-  with open(f"{o.loc}/design.fasta","w") as fasta:
-    for m,(out,pdb_filename) in enumerate(zip(outs,pdbs)):
-      out["design"] = []
-      out["n"] = []
-      af_model.prep_inputs(pdb_filename, **prep_flags)
-      for k in af_terms: out[k] = []
-      for n in range(o.num_seqs):
-        out["design"].append(m)
-        out["n"].append(n)
-        sub_seq = out["seq"][n].replace("/","")[-af_model._len:]
-        af_model.predict(seq=sub_seq, num_recycles=o.num_recycles, verbose=False)
-        for t in af_terms: out[t].append(af_model.aux["log"][t])
-        if "i_pae" in out:
-          out["i_pae"][-1] = out["i_pae"][-1] * 31
-        if "pae" in out:
-          out["pae"][-1] = out["pae"][-1] * 31
-        rmsd = out["rmsd"][-1]
+  selected = prefilter(o, outs, lengths)
+  print("running AlphaFold...")
+  if o.save_confidence:
+    os.system(f"rm -rf {o.loc}/confidence")
+  if o.workers != 1:
+    units = [(m, n, pdb_filename, out["seq"][n].replace("/","")[-L:], out["score"][n], out["seq"][n])
+             for m,(out,pdb_filename,L) in enumerate(zip(outs,pdbs,lengths)) for n in selected[m]]
+    with open(f"{o.loc}/design.fasta","w") as fasta:
+      pool_results = run_af_pool(o, contigs, units, af_terms, models, o.workers, fasta)
+    for (m, n, _, _, score, seq), results in zip(units, pool_results):
+      data.append([m, n, score, outs[m]["temperature"][n]] + [results[k] for k in metric_labels] + [seq])
+    for m in range(len(outs)):
+      rows = [(n, results) for (d, n, _, _, _, _), results in zip(units, pool_results) if d == m]
+      if len(rows) == 0:
+        continue
+      n, rmsd = save_best_design(o.loc, m, rows, models)
+      if rmsd < best["rmsd"]:
+        best = {"design":m,"n":n,"rmsd":rmsd}
+  else:
+    store = ConfidenceWriter(f"{o.loc}/confidence", prefix="main") if o.save_confidence else None
+    with open(f"{o.loc}/design.fasta","w") as fasta:
+      for m,(out,pdb_filename) in enumerate(zip(outs,pdbs)):
+        if len(selected[m]) == 0:
+          continue
+        af_model.prep_inputs(pdb_filename, **prep_flags)
+        for k in metric_labels: out[k] = []
+        rows = []
+        for n in selected[m]:
+          sub_seq = out["seq"][n].replace("/","")[-af_model._len:]
+          results = runAF(af_model, sub_seq, num_recycles=o.num_recycles, outdir=f"{o.loc}/all_pdb",
+                          id=f"design{m}_n{n}", af_terms=af_terms, models=models, store=store, key=(m, n))
+          for t in metric_labels: out[t].append(results[t])
+          rows.append((n, results))
+          af_model._k += 1
+          score_line = get_score_line(m, n, out["score"][n], results, af_terms)
+          print(" ".join(score_line)+" "+out["seq"][n])
+          line = f'>{"|".join(score_line)}\n{out["seq"][n]}'
+          fasta.write(line+"\n")
+        data += [[m, n, out["score"][n], out["temperature"][n]] + [out[k][i] for k in metric_labels] + [out["seq"][n]]
+                 for i,n in enumerate(selected[m])]
+        n, rmsd = save_best_design(o.loc, m, rows, models)
         if rmsd < best["rmsd"]:
           best = {"design":m,"n":n,"rmsd":rmsd}
-        af_model.save_current_pdb(f"{o.loc}/all_pdb/design{m}_n{n}.pdb")
-        af_model._save_results(save_best=True, verbose=False)
-        af_model._k += 1
-        score_line = [f'design:{m} n:{n}',f'mpnn:{out["score"][n]:.3f}']
-        for t in af_terms:
-          score_line.append(f'{t}:{out[t][n]:.3f}')
-        print(" ".join(score_line)+" "+out["seq"][n])
-        line = f'>{"|".join(score_line)}\n{out["seq"][n]}'
-        fasta.write(line+"\n")
-      data += [[out[k][n] for k in labels] for n in range(o.num_seqs)]
-      af_model.save_pdb(f"{o.loc}/best_design{m}.pdb")
-
-  # save best
-  with open(f"{o.loc}/best.pdb", "w") as handle:
-    remark_text = f"design {best['design']} N {best['n']} RMSD {best['rmsd']:.3f}"
-    handle.write(f"REMARK 001 {remark_text}\n")
-    handle.write(open(f"{o.loc}/best_design{best['design']}.pdb", "r").read())
-    
+    if store is not None:
+      store.close()
+
+  # save best (missing if no sequence passed the prefilter or no prediction has a finite rmsd)
+  if best["rmsd"] == np.inf:
+    if os.path.exists(f"{o.loc}/best.pdb"):
+      os.remove(f"{o.loc}/best.pdb")
+    if sum([len(x) for x in selected]) == 0:
+      print("no sequence passed the prefilter, see prefilter_rejected.csv, best.pdb is not written")
+    else:
+      print("no prediction with finite rmsd, best.pdb is not written")
+  else:
+    with open(f"{o.loc}/best.pdb", "w") as handle:
+      remark_text = f"design {best['design']} N {best['n']} RMSD {best['rmsd']:.3f}"
+      handle.write(f"REMARK 001 {remark_text}\n")
+      handle.write(open(f"{o.loc}/best_design{best['design']}.pdb", "r").read())
+
   labels[2] = "mpnn"
   df = pd.DataFrame(data, columns=labels)
   df.to_csv(f'{o.loc}/mpnn_results.csv')
+  if len(temperatures) > 1:
+    print(df.groupby("temperature")[af_terms].mean().to_string())
+  reportCompilationCache()
+
+def main(argv):
+  o = DesignabilityOptions(**vars(get_parser().parse_args(argv)))
+  run_designability(o)
 
 if __name__ == "__main__":
    main(sys.argv[1:])
\ No newline at end of file
@@ -4,16 +4,96 @@ if 'RFdiffusion' not in sys.path:
   os.environ["DGLBACKEND"] = "pytorch"
   sys.path.append('RFdiffusion')
 import subprocess
+import signal
+import threading
+import logging
+from logging.handlers import RotatingFileHandler
+from collections import deque
 import yaml
 import argparse
 
-# Run subprocess
-def run(command):
-    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True, text=True)
+# Progress messages of RFdiffusion inference
+progress_patterns = {"design":re.compile(r"Making design \S*_(\d+)"),
+                     "step":re.compile(r"Timestep (\d+)"),
+                     "finished":re.compile(r"Finished design in ([\d.]+) minutes")}
+
+# Get logger writing lines of a stream to a rotating log file
+def get_stream_logger(log_file, max_bytes=10_000_000, backup_count=3):
+    logger = logging.getLogger(f"diffuse.{log_file}")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.handlers = [handler]
+    return logger
+
+# Update progress (current design, timestep, finished designs) from output line
+def update_progress(progress, line):
+    for key,pattern in progress_patterns.items():
+        match = pattern.search(line)
+        if match is None:
+            continue
+        progress["last"] = time.monotonic()
+        if key == "finished":
+            progress["finished"] += 1
+            print(f"design {progress['design']} finished in {float(match.group(1)):.2f} minutes ({progress['finished']} done)")
+        else:
+            progress[key] = int(match.group(1))
+
+# Drain stream into log file, tracks progress and keeps the last lines for error reports
+def capture(stream, logger, progress, lock):
+    for line in stream:
+        line = line.rstrip("\n")
+        logger.info(line)
+        with lock:
+            progress["tail"].append(line)
+            update_progress(progress, line)
+
+# Run subprocess, stdout and stderr are captured to rotating log files in log_dir
+# The run is killed if there is no progress for stall_timeout seconds (0 to disable), non-zero exit codes raise an exception
+def run(command, log_dir=".", stall_timeout=1800, poll=5):
+    os.makedirs(log_dir, exist_ok=True)
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True, text=True,
+                               start_new_session=True)
+    progress = {"design":None, "step":None, "finished":0, "last":time.monotonic(), "tail":deque(maxlen=20)}
+    lock = threading.Lock()
+    loggers = []
+    threads = []
+    for stream,log_file in [(process.stdout, "rfdiffusion.out.log"), (process.stderr, "rfdiffusion.err.log")]:
+        logger = get_stream_logger(f"{log_dir}/{log_file}")
+        thread = threading.Thread(target=capture, args=(stream, logger, progress, lock), daemon=True)
+        thread.start()
+        loggers.append(logger)
+        threads.append(thread)
+
+    # Watchdog
+    stalled = 0
     while True:
-        line = process.stdout.readline()
-        if not line: break    
-    return_code = process.wait()
+        try:
+            return_code = process.wait(timeout=poll)
+            break
+        except subprocess.TimeoutExpired:
+            with lock:
+                stalled = time.monotonic() - progress["last"]
+            if stall_timeout > 0 and stalled > stall_timeout:
+                os.killpg(process.pid, signal.SIGKILL)
+                return_code = process.wait()
+                break
+    for thread in threads:
+        thread.join()
+    for logger in loggers:
+        for handler in logger.handlers:
+            handler.close()
+        logger.handlers = []
+
+    status = f"design {progress['design']}, step {progress['step']}, {progress['finished']} designs finished"
+    if stall_timeout > 0 and stalled > stall_timeout:
+        print("\n".join(progress["tail"]))
+        raise Exception(f"RFdiffusion stalled for {stalled:.0f}s and was killed ({status}), logs in {log_dir}")
+    if return_code != 0:
+        print("\n".join(progress["tail"]))
+        raise Exception(f"RFdiffusion failed with exit code {return_code} ({status}), logs in {log_dir}")
+    return return_code
 
 # Run diffusion
 def run_diffusion(type, contigs, name, path,
@@ -27,7 +107,9 @@ def run_diffusion(type, contigs, name, path,
                   enzyme_design=False,
                   partial_diffusion=False,
                   noise_scale=1,
-                  deterministic=False):
+                  deterministic=False,
+                  provide_seq="",
+                  stall_timeout=1800):
     """
     This function runs a diffusion simulation using provided input parameters, 
     applies contigs processing, and generates the final PDB structures.
@@ -47,6 +129,8 @@ def run_diffusion(type, contigs, name, path,
     noise_scale (int, optional): Change noise_scale_ca and noise_scale_frame.
     deterministic (bool, optional): Deterministic initialization.
     partial_diffusion (bool, optional): Carry out partial_diffusion
+    provide_seq (str, optional): Residue ranges (0-based, e.g. "0-49,60-60") keeping their sequence during partial diffusion.
+    stall_timeout (int, optional): Kill RFdiffusion if there is no progress for this many seconds (0 disables). Defaults to 1800.
     
     Returns:
     tuple: The updated contigs list and the number of symmetry-equivalent copies.
@@ -117,9 +201,22 @@ def run_diffusion(type, contigs, name, path,
         parsed_pdb = None
         contigs = fix_contigs(contigs, parsed_pdb)
     
-    # Process contigs and options for the partial mode
+    # Process contigs and options for the partial mode (whole input structure is noised for iterations steps)
     else:
-       raise Exception("Partial mode is not implemented yet!")
+        if pdb is None:
+            raise Exception("Partial mode needs an input pdb!")
+        pdb_filename = f"{full_path}/input.pdb"
+        os.system(f"cp {pdb} {pdb_filename}")
+        parsed_pdb = parse_pdb(pdb_filename)
+        opts.append(f"inference.input_pdb={pdb_filename}")
+        # One contig per chain of the input structure, so chain breaks are kept
+        lengths = {}
+        for chain, _ in parsed_pdb["pdb_idx"]:
+            lengths[chain] = lengths.get(chain, 0) + 1
+        contigs = [f"{length}-{length}" for length in lengths.values()]
+        partial_diffusion = True
+        if len(provide_seq) > 0:
+            opts.append(f"'contigmap.provide_seq=[{provide_seq}]'")
 
     # Add contig to options
     opts.append(f"'contigmap.contigs=[{' '.join(contigs)}]'")
@@ -149,7 +246,7 @@ def run_diffusion(type, contigs, name, path,
     cmd = f"python3.9 RFdiffusion/run_inference.py {opts_str}"
     print(cmd)
     # Run the command using a helper function "run"
-    run(cmd)
+    run(cmd, log_dir=f"{full_path}/logs", stall_timeout=stall_timeout)
 
     # Post-processing: fix PDB structures based on contigs
     for n in range(num_designs):
@@ -174,7 +271,8 @@ def run_diffusion_aa(type, contigs, name, path,
                     num_designs=10,
                     noise_scale=1,
                     deterministic=False,
-                    substrate="2PE"):
+                    substrate="2PE",
+                    stall_timeout=1800):
     """
     This function runs a diffusion-all-atom simulation using provided input parameters, 
     applies contigs processing, and generates the final PDB structures.
@@ -189,6 +287,7 @@ def run_diffusion_aa(type, contigs, name, path,
     substrate (str): The substrate to build a pocket around. Defaults to "2PE".
     noise_scale (int, optional): Change noise_scale_ca and noise_scale_frame.
     deterministic (bool, optional): Deterministic initialization.
+    stall_timeout (int, optional): Kill RFdiffusion if there is no progress for this many seconds (0 disables). Defaults to 1800.
     
     Returns:
     tuple: The updated contigs list and the number of symmetry-equivalent copies.
@@ -226,40 +325,41 @@ def run_diffusion_aa(type, contigs, name, path,
     cmd = f"cd ./rf_diffusion_all_atom && python run_inference.py {opts_str}"
     print(cmd)
     # Run the command using a helper function "run"
-    run(cmd)
+    run(cmd, log_dir=f"{full_path}/logs", stall_timeout=stall_timeout)
 
     return contigs, copies
 
 
-# Read given config
-parser = argparse.ArgumentParser()
-parser.add_argument('--config', type=str, required=True)
-args = parser.parse_args()
-config = args.config
-args = yaml.safe_load(open(config))
-args_diffusion = args["diffusion"]
-args_validation = args["validation"]
-
-# Check if output directory already exists
-name = args_diffusion["name"]
-path = args_diffusion["path"]
-if os.path.exists(f"{path}{name}/Diffusion/{name}_0.pdb"):
-  args_diffusion["name"] = name = args_diffusion["name"] + "_" + ''.join(random.choices(string.ascii_lowercase + string.digits, k=5))
-
-# Get diffusion arguments
-for k,v in args_diffusion.items():
-  if isinstance(v,str):
-    args_diffusion[k] = v.replace("'","").replace('"','')
-
-# Run diffusion
-if args_diffusion["type"] == "all-atom":
-     contigs, copies = run_diffusion_aa(**args_diffusion)
-else:
-    contigs, copies = run_diffusion(**args_diffusion)
+if __name__ == "__main__":
+    # Read given config
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', type=str, required=True)
+    args = parser.parse_args()
+    config = args.config
+    args = yaml.safe_load(open(config))
+    args_diffusion = args["diffusion"]
+    args_validation = args["validation"]
+
+    # Check if output directory already exists
+    name = args_diffusion["name"]
+    path = args_diffusion["path"]
+    if os.path.exists(f"{path}{name}/Diffusion/{name}_0.pdb"):
+      args_diffusion["name"] = name = args_diffusion["name"] + "_" + ''.join(random.choices(string.ascii_lowercase + string.digits, k=5))
+
+    # Get diffusion arguments
+    for k,v in args_diffusion.items():
+      if isinstance(v,str):
+        args_diffusion[k] = v.replace("'","").replace('"','')
+
+    # Run diffusion
+    if args_diffusion["type"] == "all-atom":
+         contigs, copies = run_diffusion_aa(**args_diffusion)
+    else:
+        contigs, copies = run_diffusion(**args_diffusion)
 
-# Copy config to results directory
-os.system(f"cp {config} {path}{name}/")
+    # Copy config to results directory
+    os.system(f"cp {config} {path}{name}/")
 
-# Print output contigs
-print("the final contigs are:")
-print(contigs, copies)
\ No newline at end of file
+    # Print output contigs
+    print("the final contigs are:")
+    print(contigs, copies)
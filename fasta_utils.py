@@ -0,0 +1,131 @@
+# Packages
+import os
+import tempfile
+
+"""
+Streaming FASTA reader with sidecar offset index (<fasta>.idx, similar to faidx)
+Records may span several lines. Each index line has a fixed width and holds the record key,
+the byte offset and the byte length of the record, so record i is found without reading the fasta file.
+Keys are "design/n" for validation headers (>design:0 n:1|mpnn:...) and the first word of the header otherwise.
+"""
+
+key_width = 64
+offset_width = 16
+length_width = 12
+line_width = key_width + offset_width + length_width + 1
+
+# Get record key from header (without ">")
+def getKey(header:str):
+    fields = header.split("|")[0].split(" ")
+    if len(fields) >= 2 and fields[0].startswith("design:") and fields[1].startswith("n:"):
+        return f"{fields[0].split(':')[-1]}/{fields[1].split(':')[-1]}"
+    return header.split(" ")[0]
+
+# Parse record string, returns header and sequence
+def parseRecord(record:str):
+    lines = record.splitlines()
+    return lines[0][1:].strip(), "".join([line.strip() for line in lines[1:]])
+
+# Read fasta file record by record, yields header and sequence
+def readFasta(path:str):
+    header = None
+    seq = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith(">"):
+                if header is not None:
+                    yield header, "".join(seq)
+                header = line[1:]
+                seq = []
+            elif len(line) > 0:
+                seq.append(line)
+    if header is not None:
+        yield header, "".join(seq)
+
+# Write sidecar index of fasta file
+def buildIndex(path:str):
+    index_path = f"{path}.idx"
+    # Unique temporary file, shards building the index at the same time do not overwrite each other
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(index_path)), suffix=".idx.tmp")
+    with open(path, "rb") as f, os.fdopen(fd, "w") as index:
+        key = None
+        start = 0
+        offset = 0
+        for line in f:
+            if line.startswith(b">"):
+                if key is not None:
+                    index.write(f"{key:<{key_width}}{start:>{offset_width}}{offset-start:>{length_width}}\n")
+                key = getKey(line[1:].decode().strip())
+                if len(key) > key_width:
+                    raise Exception(f"Fasta key {key} is longer than {key_width} characters")
+                start = offset
+            offset += len(line)
+        if key is not None:
+            index.write(f"{key:<{key_width}}{start:>{offset_width}}{offset-start:>{length_width}}\n")
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, index_path)
+    return index_path
+
+# Get index file, index is rebuilt if missing or older than the fasta file
+def getIndex(path:str):
+    index_path = f"{path}.idx"
+    if not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(path):
+        buildIndex(path)
+    return index_path
+
+# Parse index line, returns key, offset and length
+def parseIndexLine(line:str):
+    key = line[:key_width].strip()
+    offset = int(line[key_width:key_width+offset_width])
+    length = int(line[key_width+offset_width:key_width+offset_width+length_width])
+    return key, offset, length
+
+# Get key of record i
+def getKeyAt(path:str, i:int):
+    with open(getIndex(path), "r") as index:
+        index.seek(i * line_width)
+        return parseIndexLine(index.readline())[0]
+
+# Get number of records
+def countRecords(path:str):
+    return os.path.getsize(getIndex(path)) // line_width
+
+# Iterate over records start to stop (exclusive), yields header and sequence
+def iterRecords(path:str, start:int=0, stop:int=None):
+    index_path = getIndex(path)
+    count = os.path.getsize(index_path) // line_width
+    stop = count if stop is None else min(stop, count)
+    if start >= stop:
+        return
+    with open(index_path, "r") as index, open(path, "rb") as f:
+        index.seek(start * line_width)
+        _, offset, _ = parseIndexLine(index.readline())
+        index.seek(start * line_width)
+        f.seek(offset)
+        for i in range(start, stop):
+            _, _, length = parseIndexLine(index.readline())
+            yield parseRecord(f.read(length).decode())
+
+# Key lookup tables of index files, reloaded if the index file changes
+key_tables = {}
+
+# Get dictionary key -> (offset, length) of fasta file
+def getKeyTable(path:str):
+    index_path = getIndex(path)
+    mtime = os.path.getmtime(index_path)
+    if path not in key_tables or key_tables[path][0] != mtime:
+        with open(index_path, "r") as index:
+            table = {}
+            for line in index:
+                key, offset, length = parseIndexLine(line)
+                table[key] = (offset, length)
+        key_tables[path] = (mtime, table)
+    return key_tables[path][1]
+
+# Get record by key (e.g. "3/1" for design 3, n 1), returns header and sequence
+def getRecord(path:str, key:str):
+    offset, length = getKeyTable(path)[key]
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return parseRecord(f.read(length).decode())
@@ -0,0 +1,181 @@
+"""
+Check config files on CPU before jobs are submitted.
+Contigs are parsed against the residues of the input pdb, final lengths are computed and paths are checked.
+"""
+
+# Packages
+import os, re, glob, inspect, argparse
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+import yaml
+from diffuse import run_diffusion, run_diffusion_aa
+from seq_filter import filter_sequences
+
+"""
+Arguments
+--configs, -c, type=str                 # Folder with config files
+--root, type=str                        # Folder relative paths are resolved against (where the jobs run), default .
+--workers, type=int                     # Number of processes, default number of cpus
+"""
+
+amino_acids = "ACDEFGHIKLMNPQRSTVWY"
+mpnn_batch_size = 8
+required_keys = {"diffusion":["type", "name", "path", "contigs", "num_designs"],
+                 "validation":["num_seqs", "num_recycles", "initial_guess", "use_multimer", "rm_aa"]}
+
+# Get residues (chain, resnum) of a pdb file
+@lru_cache(maxsize=None)
+def get_pdb_residues(pdb:str):
+    residues = set()
+    with open(pdb) as handle:
+        for line in handle:
+            if line[:4] in ["ATOM", "HETA"] and line[12:16].strip() == "CA":
+                residues.add((line[21], int(line[22:26])))
+    return frozenset(residues)
+
+# Resolve path relative to root
+def get_path(path:str, root:str):
+    return path if os.path.isabs(path) else os.path.join(root, path)
+
+# Parse contig string, returns min length, max length, fixed segments, free segments and errors
+def parse_contigs(contigs:str):
+    errors = []
+    fixed = []
+    free = []
+    min_length, max_length = 0, 0
+    for contig in contigs.replace(",", " ").replace(":", " ").split():
+        for section in contig.split("/"):
+            if section == "0":
+                continue
+            match = re.fullmatch(r"([A-Za-z]?)(\d+)-(\d+)", section)
+            if match is None:
+                single = re.fullmatch(r"([A-Za-z]?)(\d+)", section)
+                if single is not None:
+                    errors.append(f"contig section {section} is not a range (use {section}-{single.group(2)})")
+                else:
+                    errors.append(f"contig section {section} can not be parsed")
+                continue
+            chain, a, b = match.group(1), int(match.group(2)), int(match.group(3))
+            if a > b:
+                errors.append(f"contig section {section} has start > end")
+                continue
+            if len(chain) > 0:
+                fixed.append((chain, a, b))
+                min_length += b - a + 1
+                max_length += b - a + 1
+            else:
+                free.append((a, b))
+                min_length += a
+                max_length += b
+    return min_length, max_length, fixed, free, errors
+
+# Check one config file, returns errors, warnings and final length
+def check_config(config_file:str, root:str="."):
+    errors, warnings = [], []
+    try:
+        args = yaml.safe_load(open(config_file))
+    except Exception as e:
+        return [f"config can not be read: {e}"], [], None
+    for section, keys in required_keys.items():
+        if section not in args:
+            errors.append(f"missing section {section}")
+            continue
+        errors += [f"missing {section}.{key}" for key in keys if key not in args[section]]
+    if len(errors) > 0:
+        return errors, warnings, None
+    args_diffusion = args["diffusion"]
+    args_validation = args["validation"]
+
+    # Diffusion options have to match the arguments of diffuse.py
+    func = run_diffusion_aa if args_diffusion["type"] == "all-atom" else run_diffusion
+    parameters = inspect.signature(func).parameters
+    unknown = [key for key in args_diffusion if key not in parameters]
+    if len(unknown) > 0:
+        errors.append(f"unknown diffusion options {unknown} for type {args_diffusion['type']}")
+    if not str(args_diffusion["path"]).endswith("/"):
+        warnings.append(f"diffusion.path {args_diffusion['path']} does not end with /")
+
+    # Contigs and final length
+    contigs = str(args_diffusion["contigs"])
+    min_length, max_length, fixed, free, contig_errors = parse_contigs(contigs)
+    errors += contig_errors
+    if min_length != max_length:
+        warnings.append(f"contigs have variable length {min_length}-{max_length}, validation assumes the maximum length")
+    pdb = args_diffusion.get("pdb")
+    if len(fixed) > 0 or (len(free) == 0 and len(contig_errors) == 0) or args_diffusion["type"] == "all-atom":
+        if pdb is None:
+            errors.append("pdb is required for fixed residues, partial diffusion and all-atom")
+        elif not os.path.exists(get_path(pdb, root)):
+            errors.append(f"pdb {pdb} not found")
+        else:
+            residues = get_pdb_residues(get_path(pdb, root))
+            for chain, a, b in fixed:
+                missing = [i for i in range(a, b + 1) if (chain, i) not in residues]
+                if len(missing) > 0:
+                    errors.append(f"residues {chain}{missing} of contig section {chain}{a}-{b} are missing in {pdb}")
+    if "contigs" in args_validation:
+        errors += [f"validation.{e}" for e in parse_contigs(str(args_validation["contigs"]))[4]]
+
+    # Paths and options
+    ckpt = args_diffusion.get("ckpt_override_path", "null")
+    if ckpt not in [None, "null", ""] and not os.path.exists(get_path(ckpt, root)):
+        errors.append(f"ckpt_override_path {ckpt} not found")
+    if args_diffusion.get("enzyme_design", False) and len(str(args_diffusion.get("guide_potentials", ""))) == 0:
+        errors.append("enzyme_design needs guide_potentials")
+    num_seqs = args_validation["num_seqs"]
+    if num_seqs < 1:
+        errors.append("num_seqs has to be at least 1")
+    elif num_seqs > mpnn_batch_size and num_seqs % mpnn_batch_size != 0:
+        errors.append(f"num_seqs {num_seqs} is not divisible by the mpnn batch size {mpnn_batch_size}")
+    rules = inspect.signature(filter_sequences).parameters
+    unknown = [key for key in (args_validation.get("prefilter") or {}) if key not in rules or key in ["seqs", "scores"]]
+    if len(unknown) > 0:
+        errors.append(f"unknown prefilter rules {unknown}")
+    rm_aa = str(args_validation["rm_aa"] or "")
+    if any([aa not in amino_acids for aa in rm_aa.replace(",", "")]):
+        warnings.append(f"rm_aa {rm_aa} contains unknown amino acids")
+    return errors, warnings, max_length
+
+# Check all config files in parallel, returns dictionary with errors, warnings and length of each config
+def run_preflight(config_files:list, root:str=".", workers:int=None):
+    config_files = sorted(config_files)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = dict(zip(config_files, executor.map(check_config, config_files, [root] * len(config_files))))
+    # Experiment names have to be unique, otherwise results are written to the same folder
+    names = {}
+    for config_file in config_files:
+        try:
+            args = yaml.safe_load(open(config_file))
+            names.setdefault(f"{args['diffusion']['path']}{args['diffusion']['name']}", []).append(config_file)
+        except Exception:
+            continue
+    for name, files in names.items():
+        if len(files) > 1:
+            for config_file in files:
+                results[config_file][0].append(f"experiment {name} is used by {len(files)} configs")
+    return results
+
+# Print preflight report, returns number of configs with errors
+def print_report(results:dict):
+    failed = 0
+    for config_file, (errors, warnings, length) in results.items():
+        status = "ERROR" if len(errors) > 0 else "OK"
+        print(f"{status} {config_file} length={length}")
+        for error in errors:
+            print(f"  error: {error}")
+        for warning in warnings:
+            print(f"  warning: {warning}")
+        failed += int(len(errors) > 0)
+    print(f"preflight: {len(results) - failed}/{len(results)} configs ok")
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--configs", "-c", type=str, required=True)
+    parser.add_argument("--root", type=str, default=".")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    results = run_preflight(glob.glob(f"{args.configs}/*.yml"), root=args.root, workers=args.workers)
+    if print_report(results) > 0:
+        exit(1)
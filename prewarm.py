@@ -0,0 +1,94 @@
+"""
+Compile AlphaFold and ProteinMPNN ahead of time for all lengths and protocols of a sweep.
+Compiled programs are stored in the persistent jax compilation cache and reused by the validation jobs.
+"""
+
+# Packages
+import os, glob, argparse, tempfile
+from dataclasses import replace
+import numpy as np
+from colabdesign.mpnn import mk_mpnn_model
+from designability_test import alphabet_list, get_contigs, get_protocol, get_info, get_af_terms, setup_af_model, \
+    get_temperatures, sample_temperatures
+from validate import get_options
+from af_utils import initCompilationCache, reportCompilationCache, getModelNames, runAF
+
+"""
+Arguments
+--configs, -c, type=str                 # Folder with config files of the sweep
+--jax_cache, type=str                   # Persistent jax compilation cache, default jax_cache
+"""
+
+# Get validation options of a config (same as validate.py)
+def getOptions(config:str):
+    o = get_options(config)
+    return replace(o, rm_aa=None if o.rm_aa == "" else o.rm_aa)
+
+# Get compilation key, configs with the same key share compiled programs
+# MPNN samples min(num_seqs, 8) sequences at every temperature in one call with the weights baked into the program
+def getKey(o):
+    contigs = get_contigs(o.contigs)
+    protocol, _, _, _ = get_protocol(contigs)
+    lengths = tuple([len(get_info(contig)[0]) for contig in contigs])
+    models = tuple(getModelNames(o.models, o.use_multimer))
+    return (protocol, lengths, bool(o.use_multimer), models, bool(o.initial_guess),
+            min(o.num_seqs, 8), len(get_temperatures(o)), bool(o.use_soluble))
+
+# Write ideal helix backbone with one chain per contig
+def writeBackbone(lengths:tuple, filename:str):
+    lines = []
+    atom = 1
+    for c,length in enumerate(lengths):
+        for i in range(length):
+            angle = np.deg2rad(100 * i)
+            for name,radius,shift in [("N",1.6,-0.8),("CA",2.3,0.0),("C",1.7,0.8),("O",1.2,1.5)]:
+                x = radius * np.cos(angle + shift / 2.3) + 30 * c
+                y = radius * np.sin(angle + shift / 2.3)
+                z = 1.5 * i + shift
+                lines.append("ATOM  %5d  %-3s GLY %s%4d    %8.3f%8.3f%8.3f  1.00  0.00           %s\n"
+                             % (atom, name, alphabet_list[c], i + 1, x, y, z, name[0]))
+                atom += 1
+        lines.append("TER\n")
+    lines.append("END\n")
+    with open(filename, "w") as handle:
+        handle.writelines(lines)
+
+# Compile AF and ProteinMPNN for one key
+def compileKey(o, outdir:str):
+    contigs = get_contigs(o.contigs)
+    protocol, af_model, prep_flags, fixed_pos, models = setup_af_model(o, contigs)
+    pdb_filename = f"{outdir}/backbone.pdb"
+    writeBackbone(tuple([len(get_info(contig)[0]) for contig in contigs]), pdb_filename)
+    af_model.prep_inputs(pdb_filename, **prep_flags)
+    if protocol == "partial":
+        p = np.where(fixed_pos)[0]
+        af_model.opt["fix_pos"] = p[p < af_model._len]
+    mpnn_model = mk_mpnn_model(weights="soluble" if o.use_soluble else "original")
+    mpnn_model.get_af_inputs(af_model)
+    batch_size = min(o.num_seqs, 8)
+    out = sample_temperatures(mpnn_model, batch_size, batch_size, get_temperatures(o))
+    seq = out["seq"][0].replace("/","")[-af_model._len:]
+    runAF(af_model, seq, num_recycles=o.num_recycles, outdir=outdir, id="prewarm",
+          af_terms=get_af_terms(protocol, o.copies), models=models)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--configs", "-c", type=str, required=True)
+    parser.add_argument("--jax_cache", type=str, default="jax_cache")
+    args = parser.parse_args()
+
+    # Collect compilation keys of the sweep
+    keys = {}
+    for config in sorted(glob.glob(f"{args.configs}/*.yml")):
+        o = getOptions(config)
+        keys.setdefault(getKey(o), o)
+    print(f"Found {len(keys)} length/protocol combinations")
+
+    # Compile every combination once
+    initCompilationCache(args.jax_cache)
+    with tempfile.TemporaryDirectory() as outdir:
+        for key,o in keys.items():
+            print("compiling", key)
+            compileKey(o, outdir)
+    reportCompilationCache()
@@ -0,0 +1,117 @@
+"""
+Refine the top validated designs with partial diffusion.
+Creates one config per (design, noise setting) which runs partial diffusion on the design backbone
+followed by the usual validation (ProteinMPNN + AF2), and records the lineage of each refined design.
+The configs can be submitted with run_cluster.py or run with diffuse.py and validate.py.
+"""
+
+# Packages
+import os, sys, glob, copy, argparse
+import yaml
+import pandas as pd
+
+"""
+Arguments
+--input, -i, type=str                   # Experiment folders (glob pattern) with Diffusion and Validation results
+--configdir, -c, type=str               # Output folder for refinement configs
+--top_k, -k, type=int                   # Number of designs to refine, default 10
+--partial_T, -t, type=str               # Comma separated noise settings (partial diffusion steps), default 5,10,20
+--num_designs, -n, type=int             # Refined backbones per design and noise setting, default 4
+--metric, type=str                      # Metric to rank designs (rmsd, pae, i_pae, mpnn: lower is better, else higher), default rmsd
+"""
+
+# Get fixed residue ranges (0-based) of a contig string, e.g. "0-0,46-46"
+def get_fixed_ranges(contigs:str):
+    ranges = []
+    start = 0
+    for section in contigs.replace(",", " ").replace(":", " ").replace(" ", "/").split("/"):
+        if section in ["", "0"]:
+            continue
+        a, b = section.split("-")
+        if a[0].isalpha():
+            length = int(b) - int(a[1:]) + 1
+            ranges.append(f"{start}-{start + length - 1}")
+        else:
+            length = int(b)
+        start += length
+    return ",".join(ranges)
+
+# Get contig of all chains of a PDB (residue ranges of the CA atoms), e.g. "A1-60 B1-40"
+def get_pdb_contigs(pdb:str):
+    chains = {}
+    with open(pdb) as handle:
+        for line in handle:
+            if line[:4] == "ATOM" and line[12:16].strip() == "CA":
+                chains.setdefault(line[21], []).append(int(line[22:26]))
+    return " ".join(f"{chain}{min(residues)}-{max(residues)}" for chain, residues in chains.items())
+
+# Metrics where lower is better, all other metrics are ranked descending
+lower_is_better = {"rmsd", "pae", "i_pae", "mpnn"}
+
+# Get best sequence of each design in an experiment
+def get_designs(experiment:str, metric:str):
+    results = f"{experiment}/Validation/mpnn_results.csv"
+    if not os.path.exists(results):
+        return None
+    df = pd.read_csv(results, index_col=0)
+    df = df.sort_values(metric, ascending=(metric in lower_is_better)).groupby("design", sort=False).head(1)
+    df["experiment"] = experiment
+    return df
+
+# Create refinement configs, returns lineage table
+def create_refinement_configs(designs, configdir:str, partial_T:list, num_designs:int):
+    lineage = []
+    for _, row in designs.iterrows():
+        experiment = row["experiment"]
+        config = yaml.safe_load(open(glob.glob(f"{experiment}/*.yml")[0]))
+        parent = config["diffusion"]["name"]
+        contigs = config["validation"].get("contigs", config["diffusion"]["contigs"])    # Motif contigs of refined designs
+        design = int(row["design"])
+        pdb = f"{experiment}/Diffusion/{parent}_{design}.pdb"
+        for T in partial_T:
+            name = f"{parent}_d{design}_T{T}"
+            refined = copy.deepcopy(config)
+            refined["diffusion"].update({"name":name,
+                                         "contigs":get_pdb_contigs(pdb),
+                                         "pdb":pdb,
+                                         "iterations":T,
+                                         "num_designs":num_designs,
+                                         "partial_diffusion":True,
+                                         "provide_seq":get_fixed_ranges(contigs)})
+            refined["validation"]["contigs"] = contigs
+            refined["refinement"] = {"parent":parent, "design":design, "n":int(row["n"]), "partial_T":T}
+            with open(f"{configdir}/{name}.yml", "w") as file:
+                yaml.dump(refined, file)
+            lineage.append({"name":name, "parent":parent, "design":design, "n":int(row["n"]), "partial_T":T,
+                            "num_designs":num_designs, "pdb":pdb, "rmsd":row["rmsd"], "plddt":row["plddt"]})
+    return pd.DataFrame(lineage)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", "-i", type=str, required=True)
+    parser.add_argument("--configdir", "-c", type=str, required=True)
+    parser.add_argument("--top_k", "-k", type=int, default=10)
+    parser.add_argument("--partial_T", "-t", type=str, default="5,10,20")
+    parser.add_argument("--num_designs", "-n", type=int, default=4)
+    parser.add_argument("--metric", type=str, default="rmsd")
+    args = parser.parse_args()
+
+    # Select top designs over all experiments
+    designs = [get_designs(experiment, args.metric) for experiment in sorted(glob.glob(args.input))]
+    designs = [df for df in designs if df is not None and len(df) > 0]
+    if len(designs) == 0:
+        sys.exit(f"No validated designs found in {args.input} (no Validation/mpnn_results.csv with results), no configs written")
+    designs = pd.concat(designs, ignore_index=True)
+    designs = designs.sort_values(args.metric, ascending=(args.metric in lower_is_better)).head(args.top_k)
+    print(designs[["experiment","design","n",args.metric]].to_string())
+
+    # Write configs and lineage
+    os.makedirs(args.configdir, exist_ok=True)
+    partial_T = [int(x) for x in args.partial_T.split(",")]
+    lineage = create_refinement_configs(designs, args.configdir, partial_T, args.num_designs)
+    lineage_file = f"{args.configdir}/lineage.csv"
+    if os.path.exists(lineage_file):
+        lineage = pd.concat([pd.read_csv(lineage_file), lineage], ignore_index=True)
+    lineage.to_csv(lineage_file, index=False)
+    print(f"{len(partial_T) * len(designs)} refinement configs written to {args.configdir}")
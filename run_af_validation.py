@@ -18,13 +18,28 @@ Arguments
 --output, -o, type=str                  # Output folder
 --num_recycles, -r, type=int            # Number of recycles (>1)
 --use_multimer, -m, type=str            # Use multimer
+--models, type=str                      # AF models to evaluate (e.g. 1,2,3), default model 1
+--shard, -s, type=str                   # Shard to process (i/N), default 0/1
+--merge                                 # Merge shard results into mpnn_results.csv and exit
+--jax_cache, type=str                   # Persistent jax compilation cache, default jax_cache ("" to disable)
 """
 
 # Read arguments
 af_terms = ["plddt","ptm","pae","rmsd"]
 copies = 1
 args, use_multimer = getArgs()                              # Get arguments
-entries = getSeq(f"{args.input}/Validation/*.fasta")        # Get sequences from validation
+exp = args.input.split("/")[-1]
+outdir = f"{args.input}/{args.output}"
+
+# Merge shard results
+if args.merge:
+    df = mergeShards(outdir)
+    print(f"Merged {len(df)} results into {outdir}/mpnn_results.csv")
+    sys.exit(0)
+
+shard, num_shards = parseShard(args.shard)                  # Get shard
+initCompilationCache(args.jax_cache)                        # Use persistent compilation cache
+fasta = getFasta(f"{args.input}/Validation/*.fasta")        # Get fasta file from validation
 config = glob.glob(f"{args.input}/*.yml")[0]                # Get config
 contig = getContig(config)                                  # Get contig string
 pos, (fixed_chain,free_chain) = get_info(contig)            # Get info
@@ -35,7 +50,7 @@ both_chains = fixed_chain and free_chain
 
 flags = {"best_metric":"rmsd",
          "use_multimer":use_multimer,
-         "model_names":["model_1_multimer_v3" if use_multimer else "model_1_ptm"]}
+         "model_names":getModelNames(args.models, use_multimer)}
 
 # Partial diffusion (Template used)
 if sum(pos) > 0:
@@ -59,11 +74,12 @@ else:
                   "homooligomer":copies>1}
 
 # Save results
-exp = args.input.split("/")[-1]
-outdir = f"{args.input}/{args.output}"
-if not os.path.exists(outdir):
-    os.makedirs(f"{outdir}/all_pdb")
-predict(entries=entries, args=args, af_model=af_model, exp=exp, af_terms=af_terms,prep_flags=prep_flags, outdir=outdir)
+os.makedirs(f"{outdir}/all_pdb", exist_ok=True)
+units = getShardUnits(fasta, shard, num_shards)
+results_file = getResultsFile(outdir, shard, num_shards)
+predict(units=units, args=args, af_model=af_model, exp=exp, af_terms=af_terms, prep_flags=prep_flags,
+        outdir=outdir, results_file=results_file)
+reportCompilationCache()
 file = open(f"{outdir}/config.yml","w")
 yaml.dump(args, file)
 
@@ -1,17 +1,22 @@
 # Packages
-import subprocess, glob, time, os, argparse
+import subprocess, glob, time, os, argparse, json, csv
+import yaml
+from preflight import get_path
 
 # Create a slurm script
+# config is a single config file or a list of config files which are run one after another in the same job (packing).
+# With array (e.g. "0-9%4") config is a list with one entry per array task, an entry can hold several space separated configs.
 def create_slurm_script(colabdesign_path, slurm_path, container, config, script, 
                         outdir, name, jobname, time='24:00:00', mem='10000', cpus=1, 
                         gpu='a30:1', partition='paula', email='', emailType='FAIL', 
-                        excludeNodes='', dependency=''):
+                        excludeNodes='', dependency='', dependencyType='afterok', array=''):
+    suffix = "_%a" if len(array) > 0 else ""
     with open(f'{slurm_path}/{name}.slurm', 'w') as slurmFile:
         slurmFile.writelines([
                 "#!/bin/bash\n",
                 f"#SBATCH --job-name={jobname}\n",
-                f"#SBATCH --output={outdir}/{name}.out\n",
-                f"#SBATCH --error={outdir}/{name}.err\n",
+                f"#SBATCH --output={outdir}/{name}{suffix}.out\n",
+                f"#SBATCH --error={outdir}/{name}{suffix}.err\n",
                 f"#SBATCH --time={time}\n",
                 f"#SBATCH --mem={mem}\n",
                 f"#SBATCH --cpus-per-task={cpus}\n",
@@ -21,17 +26,43 @@ def create_slurm_script(colabdesign_path, slurm_path, container, config, script,
                 f"#SBATCH --mail-type={emailType}\n",
                 f"#SBATCH --exclude={excludeNodes}\n"
         ])
+        if len(array) > 0:
+            slurmFile.writelines([
+                f"#SBATCH --array={array}\n"
+            ])
         if len(dependency) > 0:
             slurmFile.writelines([
-                f"#SBATCH --dependency=afterok:{dependency}\n"
+                f"#SBATCH --dependency={dependencyType}:{dependency}\n"
             ])
         slurmFile.writelines([
                 '# define CONTAINER\n',
-                f'CONTAINER={container}\n',
+                f'CONTAINER={container}\n'
+        ])
+        if isinstance(config, str):
+            slurmFile.writelines([
                 '# define SCRIPT or program to call inside the container\n',
                 f'SCRIPT="{script} --config {config}"\n',
                 f'cd {colabdesign_path}\n',
                 'singularity exec --nv --cleanenv $CONTAINER $SCRIPT\n'      
+            ])
+            return
+        if len(array) > 0:
+            tasks = " ".join([f'"{x}"' for x in config])
+            slurmFile.writelines([
+                '# define CONFIGS of each array task\n',
+                f'TASKS=({tasks})\n',
+                'CONFIGS=${TASKS[$SLURM_ARRAY_TASK_ID]}\n'
+            ])
+        else:
+            slurmFile.writelines([
+                '# define CONFIGS to run one after another\n',
+                f'CONFIGS="{" ".join(config)}"\n'
+            ])
+        slurmFile.writelines([
+                f'cd {colabdesign_path}\n',
+                'for CONFIG in $CONFIGS; do\n',
+                f'  singularity exec --nv --cleanenv $CONTAINER {script} --config $CONFIG || exit 1\n',
+                'done\n'
         ])
 
 # Run single slurm script, returns job id and error message
@@ -93,15 +124,30 @@ def check_if_validation_done(name,slurm_path):
             return True
         return False
 
-# Check if GPU is used during diffusion, returns Ture/False
-def check_if_gpu_used(name, slurm_path):
-    if not os.path.exists(f"{slurm_path}/Diffusion/{name}.err"):
+# Check if GPU is used during diffusion (or validation), returns Ture/False
+def check_if_gpu_used(name, slurm_path, stage="Diffusion"):
+    if not os.path.exists(f"{slurm_path}/{stage}/{name}.err"):
         return False
-    with open(f"{slurm_path}/Diffusion/{name}.err") as myfile:
+    with open(f"{slurm_path}/{stage}/{name}.err") as myfile:
         if "CUDA unknown error" in myfile.read():
             return False
         return True
 
+# Get state and node of a job, returns state and node list
+def get_job_info(job_id):
+    slurm_command = f'/usr/bin/sacct -j {job_id} -X -n -P -o State,NodeList'
+    process = subprocess.Popen(slurm_command,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE,
+                               universal_newlines=True,
+                               shell=True)
+    output, error = process.communicate()
+    lines = output.strip().splitlines()
+    if len(lines) == 0:
+        return "PENDING", ""
+    state, node = lines[0].split("|")[:2]
+    return state.split()[0], node
+
 # Cancel job, returns output and error message
 def cancel_job(job_id):
     slurm_command = f'/usr/bin/scancel {job_id}'
@@ -120,7 +166,7 @@ def resubmit_job(name,job_id,slurm_path):
     return output, error
     
 # Start diffusion jobs, returns dictionary with job ids and dictionary with error messages   
-def run_diffusion(colabdesign_path, config_path, slurm_path, container, diffusion_path):
+def run_diffusion(colabdesign_path, config_path, slurm_path, container, diffusion_path, excludeNodes=''):
     config_files = glob.glob(
         f'{config_path}/*.yml')
     for config_file in config_files:
@@ -128,13 +174,13 @@ def run_diffusion(colabdesign_path, config_path, slurm_path, container, diffusio
         create_slurm_script(colabdesign_path=colabdesign_path, slurm_path=slurm_path, container=container,
                             config=config_file, script=diffusion_path, outdir=slurm_path,name=f"{name}_diffusion",
                             jobname=f"diff-{name}", time="01:00:00", mem="10000", cpus=1, gpu="a30:1", 
-                            partition="paula",email="", emailType="FAIL", excludeNodes='')
+                            partition="paula",email="", emailType="FAIL", excludeNodes=excludeNodes)
     job_ids, errors = run_all_slurm_scripts(slurm_path=slurm_path)
     return job_ids, errors
 
 
 # Start validation job if diffusion is done, returns dictionary with job ids and dictionary with error messages 
-def run_validation(colabdesign_path, config_path, slurm_path, diffusion_job_ids, container, validation_path):
+def run_validation(colabdesign_path, config_path, slurm_path, diffusion_job_ids, container, validation_path, excludeNodes=''):
     validation_job_ids = {}
     validation_errors = {}
     for name,job_id in diffusion_job_ids.items():
@@ -146,44 +192,322 @@ def run_validation(colabdesign_path, config_path, slurm_path, diffusion_job_ids,
         create_slurm_script(colabdesign_path=colabdesign_path, slurm_path=slurm_path, container=container,
                             config=config_file, script=validation_path, outdir=slurm_path, name=slurm_name,
                             jobname=f"val-{exp_name}", time="01:00:00", mem="10000", cpus=1, gpu="a30:1",
-                            partition="paula", email="", emailType="FAIL", excludeNodes="", dependency=job_id)
+                            partition="paula", email="", emailType="FAIL", excludeNodes=excludeNodes, dependency=job_id)
     validation_job_ids, errors = run_all_slurm_scripts(slurm_path=slurm_path)
     return validation_job_ids, validation_errors
 
 
+# Load per node job statistics
+def load_node_stats(stats_file):
+    if not os.path.exists(stats_file):
+        return {}
+    with open(stats_file) as myfile:
+        return json.load(myfile)
+
+# Save per node job statistics
+def save_node_stats(stats, stats_file):
+    with open(f"{stats_file}.tmp", "w") as myfile:
+        json.dump(stats, myfile, indent=2)
+    os.replace(f"{stats_file}.tmp", stats_file)
+
+# Record job outcome for node(s), node errors are failures caused by the node (GPU error, node failure)
+def record_job(stats, nodes, failed, node_error):
+    for node in [x for x in nodes.split(",") if x not in ["", "None", "None assigned"]]:
+        node_stats = stats.setdefault(node, {"jobs":0, "failures":0, "node_errors":[]})
+        node_stats["jobs"] += 1
+        node_stats["failures"] += int(failed)
+        if node_error:
+            node_stats["node_errors"].append(time.time())
+
+# Get nodes with at least max_errors node errors within the last window seconds (rolling exclusion list)
+def get_excluded_nodes(stats, max_errors=2, window=86400):
+    now = time.time()
+    excluded = []
+    for node, node_stats in sorted(stats.items()):
+        if len([t for t in node_stats["node_errors"] if now - t < window]) >= max_errors:
+            excluded.append(node)
+    return excluded
+
+# Create and submit the diffusion or validation job of one config, returns job id and error message
+def submit_config(exp_name, stage, colabdesign_path, config_path, slurm_path, container, script, excludeNodes='', dependency=''):
+    folder = stage.capitalize()
+    name = f"{exp_name}_{stage}"
+    create_slurm_script(colabdesign_path=colabdesign_path, slurm_path=f"{slurm_path}/{folder}", container=container,
+                        config=f"{config_path}/{exp_name}.yml", script=script, outdir=f"{slurm_path}/{folder}", name=name,
+                        jobname=f"{'diff' if stage == 'diffusion' else 'val'}-{exp_name}", time="01:00:00", mem="10000",
+                        cpus=1, gpu="a30:1", partition="paula", email="", emailType="FAIL", excludeNodes=excludeNodes,
+                        dependency=dependency)
+    return run_slurm_script(name=name, cwd=f"{slurm_path}/{folder}")
+
+# Watch diffusion and validation jobs, attribute failures to nodes and resubmit failed jobs on other nodes
+def supervise(colabdesign_path, config_path, slurm_path, diffusion_job_ids, validation_job_ids,
+              diffusion_container, validation_container, diffusion_path, validation_path,
+              interval=60, max_retries=2, max_errors=2, window=86400):
+    stats_file = f"{slurm_path}/node_stats.json"
+    stats = load_node_stats(stats_file)
+    containers = {"diffusion":(diffusion_container, diffusion_path), "validation":(validation_container, validation_path)}
+    jobs = {}
+    for name, job_id in diffusion_job_ids.items():
+        exp_name = name[:-10]
+        jobs[exp_name] = {"diffusion":job_id, "validation":validation_job_ids.get(f"{exp_name}_validation", ""), "retries":0,
+                          "failed_nodes":[]}
+    active = [(exp_name, stage) for exp_name in jobs for stage in ["diffusion", "validation"]]
+    while len(active) > 0:
+        time.sleep(interval)
+        # Diffusion first, a failed diffusion job replaces the validation job depending on it
+        for exp_name, stage in sorted(active, key=lambda x: x[1]):
+            if (exp_name, stage) not in active:
+                continue
+            if stage == "validation" and (exp_name, "diffusion") in active:
+                continue
+            state, node = get_job_info(jobs[exp_name][stage])
+            if state in ["PENDING", "RUNNING", "CONFIGURING", "COMPLETING", "REQUEUED", "RESIZING", "SUSPENDED"]:
+                continue
+            name = f"{exp_name}_{stage}"
+            gpu_error = os.path.exists(f"{slurm_path}/{stage.capitalize()}/{name}.err") and \
+                not check_if_gpu_used(name, slurm_path, stage=stage.capitalize())
+            failed = state != "COMPLETED" or gpu_error
+            record_job(stats, node, failed, gpu_error or state == "NODE_FAIL")
+            save_node_stats(stats, stats_file)
+            if not failed:
+                active.remove((exp_name, stage))
+                continue
+
+            # Give up after max_retries
+            if jobs[exp_name]["retries"] >= max_retries:
+                print(f"{name} failed {jobs[exp_name]['retries'] + 1} times ({state} on {node}), giving up")
+                active.remove((exp_name, stage))
+                if stage == "diffusion":
+                    cancel_job(jobs[exp_name]["validation"])
+                    active.remove((exp_name, "validation"))
+                continue
+
+            # Resubmit on other nodes (known bad nodes and nodes this experiment failed on) and rewire dependency
+            jobs[exp_name]["retries"] += 1
+            if node not in ["", None, "None assigned"] and node not in jobs[exp_name]["failed_nodes"]:
+                jobs[exp_name]["failed_nodes"].append(node)
+            excluded = get_excluded_nodes(stats, max_errors=max_errors, window=window)
+            excludeNodes = ",".join(sorted(set(excluded) | set(jobs[exp_name]["failed_nodes"])))
+            container, script = containers[stage]
+            job_id, error = submit_config(exp_name, stage, colabdesign_path, config_path, slurm_path, container, script,
+                                          excludeNodes=excludeNodes)
+            print(f"{name} failed ({state} on {node}), resubmitted as {job_id} excluding [{excludeNodes}]")
+            jobs[exp_name][stage] = job_id
+            if stage == "diffusion":
+                cancel_job(jobs[exp_name]["validation"])
+                container, script = containers["validation"]
+                jobs[exp_name]["validation"], error = submit_config(exp_name, "validation", colabdesign_path, config_path,
+                                                                    slurm_path, container, script,
+                                                                    excludeNodes=excludeNodes, dependency=job_id)
+    return jobs, stats
+
+# Count designs with at least one sequence passing the thresholds in validation results
+def count_passing_designs(results_file, max_rmsd=2.0, min_plddt=0.8, max_pae=10.0):
+    if not os.path.exists(results_file):
+        return 0
+    passing = set()
+    with open(results_file) as myfile:
+        for row in csv.DictReader(myfile):
+            pae = row["i_pae"] if "i_pae" in row else row["pae"]
+            if float(row["rmsd"]) <= max_rmsd and float(row["plddt"]) >= min_plddt and float(pae) <= max_pae:
+                passing.add(row["design"])
+    return len(passing)
+
+# Write config of the next chunk (num_designs = chunk_size), returns chunk name and results file
+# Relative result paths are resolved against colabdesign_path, where the jobs run
+def create_chunk_config(config_file, chunk_path, chunk, chunk_size, colabdesign_path="."):
+    config = yaml.safe_load(open(config_file))
+    name = f"{config['diffusion']['name']}_q{chunk}"
+    config['diffusion']['name'] = name
+    config['diffusion']['num_designs'] = chunk_size
+    # Deterministic chunks would repeat the same designs
+    config['diffusion']['deterministic'] = False
+    with open(f"{chunk_path}/{name}.yml", "w") as myfile:
+        yaml.dump(config, myfile)
+    return name, get_path(f"{config['diffusion']['path']}{name}/Validation/mpnn_results.csv", colabdesign_path)
+
+# Run diffusion and validation in chunks until quota designs pass validation or max_designs are generated (per config)
+def run_quota(colabdesign_path, config_path, slurm_path, diffusion_container, validation_container,
+              diffusion_path, validation_path, quota=10, chunk_size=10, max_designs=100, parallel=2,
+              max_rmsd=2.0, min_plddt=0.8, max_pae=10.0, interval=60, excludeNodes=''):
+    chunk_path = f"{slurm_path}/QuotaConfigs"
+    os.makedirs(chunk_path, exist_ok=True)
+    containers = {"diffusion":(diffusion_container, diffusion_path), "validation":(validation_container, validation_path)}
+    experiments = {}
+    for config_file in sorted(glob.glob(f'{config_path}/*.yml')):
+        exp_name = config_file.split('/')[-1].split('.')[0]
+        experiments[exp_name] = {"config":config_file, "chunks":0, "passing":0, "running":{}, "done":False}
+
+    # Submit diffusion and validation job of the next chunk
+    def submit_chunk(experiment):
+        name, results_file = create_chunk_config(experiment["config"], chunk_path, experiment["chunks"], chunk_size,
+                                                 colabdesign_path=colabdesign_path)
+        experiment["chunks"] += 1
+        job_ids = {}
+        dependency = ''
+        for stage in ["diffusion", "validation"]:
+            container, script = containers[stage]
+            job_ids[stage], error = submit_config(name, stage, colabdesign_path, chunk_path, slurm_path, container, script,
+                                                  excludeNodes=excludeNodes, dependency=dependency)
+            dependency = job_ids[stage]
+        experiment["running"][name] = (job_ids, results_file)
+
+    max_chunks = max(1, max_designs // chunk_size)
+    for experiment in experiments.values():
+        for _ in range(min(parallel, max_chunks)):
+            submit_chunk(experiment)
+
+    while not all([experiment["done"] for experiment in experiments.values()]):
+        time.sleep(interval)
+        for exp_name, experiment in experiments.items():
+            if experiment["done"]:
+                continue
+            for name, (job_ids, results_file) in list(experiment["running"].items()):
+                if check_if_job_is_done(job_ids["diffusion"]) and not check_if_diffusion_done(f"{name}_diffusion", slurm_path):
+                    # Failed diffusion, the validation job would never start
+                    cancel_job(job_ids["validation"])
+                elif not check_if_job_is_done(job_ids["validation"]):
+                    continue
+                elif not os.path.exists(results_file):
+                    print(f"Warning: {exp_name}: validation of {name} finished without results file {results_file}")
+                del experiment["running"][name]
+                experiment["passing"] += count_passing_designs(results_file, max_rmsd=max_rmsd, min_plddt=min_plddt, max_pae=max_pae)
+                print(f"{exp_name}: {name} done, {experiment['passing']}/{quota} designs passed")
+            if experiment["passing"] >= quota:
+                # Quota reached, cancel pending work
+                for job_ids, _ in experiment["running"].values():
+                    cancel_job(job_ids["validation"])
+                    cancel_job(job_ids["diffusion"])
+                experiment["running"] = {}
+                experiment["done"] = True
+                print(f"{exp_name}: quota reached after {experiment['chunks']} chunks")
+            elif experiment["chunks"] < max_chunks:
+                while len(experiment["running"]) < parallel and experiment["chunks"] < max_chunks:
+                    submit_chunk(experiment)
+            elif len(experiment["running"]) == 0:
+                experiment["done"] = True
+                print(f"{exp_name}: budget of {max_designs} designs exhausted, {experiment['passing']} designs passed")
+    return experiments
+
+# Split config files into groups of pack configs
+def get_config_groups(config_path, pack=1):
+    config_files = sorted(glob.glob(f'{config_path}/*.yml'))
+    return [config_files[i:i+pack] for i in range(0, len(config_files), pack)]
+
+# Start diffusion and validation jobs for packed configs or as job arrays, returns dictionaries with job ids and error messages
+def run_workflow(colabdesign_path, config_path, slurm_path, diffusion_container, validation_container,
+                 diffusion_path, validation_path, pack=1, array=False, throttle=0, excludeNodes=''):
+    groups = get_config_groups(config_path=config_path, pack=pack)
+    job_ids = {}
+    errors = {}
+    stages = [("diffusion", "Diffusion", diffusion_container, diffusion_path),
+              ("validation", "Validation", validation_container, validation_path)]
+    if array:
+        array_str = f"0-{len(groups)-1}" + (f"%{throttle}" if throttle > 0 else "")
+        dependency = ''
+        for stage, folder, container, script in stages:
+            name = f"array_{stage}"
+            create_slurm_script(colabdesign_path=colabdesign_path, slurm_path=f"{slurm_path}/{folder}", container=container,
+                                config=[" ".join(group) for group in groups], script=script, outdir=f"{slurm_path}/{folder}",
+                                name=name, jobname=f"{stage[:3]}-array", time="01:00:00", mem="10000", cpus=1, gpu="a30:1",
+                                partition="paula", email="", emailType="FAIL", excludeNodes=excludeNodes, dependency=dependency,
+                                dependencyType="aftercorr", array=array_str)
+            job_ids[name], errors[name] = run_slurm_script(name=name, cwd=f"{slurm_path}/{folder}")
+            dependency = job_ids[name]
+        return job_ids, errors
+
+    for n, group in enumerate(groups):
+        dependency = ''
+        for stage, folder, container, script in stages:
+            name = f"pack{n}_{stage}"
+            create_slurm_script(colabdesign_path=colabdesign_path, slurm_path=f"{slurm_path}/{folder}", container=container,
+                                config=group, script=script, outdir=f"{slurm_path}/{folder}", name=name,
+                                jobname=f"{stage[:3]}-pack{n}", time="01:00:00", mem="10000", cpus=1, gpu="a30:1",
+                                partition="paula", email="", emailType="FAIL", excludeNodes=excludeNodes, dependency=dependency)
+            job_ids[name], errors[name] = run_slurm_script(name=name, cwd=f"{slurm_path}/{folder}")
+            dependency = job_ids[name]
+    return job_ids, errors
+
+
 """
 MAIN
 """
 
-# Global variables
-argParser = argparse.ArgumentParser()
-argParser.add_argument('-r','--run')                                                                    # Name of run
-args = argParser.parse_args()
-
-# Adapt paths!
-diffusion_container = "/home/proteindesign.sif"                                                         # Location diffusion container
-validation_container = "/home/colabdesign1.1.0.sif"                                                     # Location validation container
-config_path = f"/home/{args.run}/Configs"                                                               # Location config files
-slurm_path = f"/home/{args.run}/Slurm"                                                                  # Location slurm files
-colabdesign_path = "/home/Colabdesign"                                                                  # Location colabdesign repository
-diffusion_path = "python3.9 diffuse.py"                                                                 # Call diffuse.py 
-validation_path = "python3 validate.py"                                                                 # Call validate.py
-
-# Run diffusion and validation
-if not os.path.exists(f"{slurm_path}/Diffusion"):
-   os.makedirs(f"{slurm_path}/Diffusion")
-   os.makedirs(f"{slurm_path}/Validation")
-diffusion_job_ids, diffusion_errors = run_diffusion(colabdesign_path=colabdesign_path, 
-                                                    config_path=config_path,
-                                                    slurm_path=f"{slurm_path}/Diffusion",
-                                                    container=diffusion_container,
-                                                    diffusion_path=diffusion_path)
-print("Diffusion jobs submitted")
-
-validation_job_ids, validation_errors = run_validation(colabdesign_path=colabdesign_path,
-                                                       config_path=config_path,
-                                                       slurm_path=f"{slurm_path}/Validation",
-                                                       diffusion_job_ids=diffusion_job_ids,
-                                                       container=validation_container,
-                                                       validation_path=validation_path)
-print("Validation jobs submitted")
\ No newline at end of file
+if __name__ == "__main__":
+    # Global variables
+    argParser = argparse.ArgumentParser()
+    argParser.add_argument('-r','--run')                                                                    # Name of run
+    argParser.add_argument('--pack', type=int, default=1)                                                   # Configs per job
+    argParser.add_argument('--array', action='store_true')                                                  # Submit job arrays
+    argParser.add_argument('--throttle', type=int, default=0)                                               # Max running array tasks
+    argParser.add_argument('--supervise', action='store_true')                                              # Resubmit jobs failed on bad nodes
+    argParser.add_argument('--skip_preflight', action='store_true')                                         # Submit without checking configs
+    argParser.add_argument('--quota', type=int, default=0)                                                  # Stop when quota designs passed (per config)
+    argParser.add_argument('--chunk_size', type=int, default=10)                                            # Designs per chunk in quota mode
+    argParser.add_argument('--max_designs', type=int, default=100)                                          # Design budget per config in quota mode
+    argParser.add_argument('--parallel', type=int, default=2)                                               # Chunks in flight per config in quota mode
+    argParser.add_argument('--max_rmsd', type=float, default=2.0)                                           # Quota thresholds
+    argParser.add_argument('--min_plddt', type=float, default=0.8)
+    argParser.add_argument('--max_pae', type=float, default=10.0)
+    args = argParser.parse_args()
+    if args.supervise and (args.pack > 1 or args.array or args.quota > 0):
+        argParser.error("--supervise works with one job per config, not with --pack, --array or --quota")
+
+    # Adapt paths!
+    diffusion_container = "/home/proteindesign.sif"                                                         # Location diffusion container
+    validation_container = "/home/colabdesign1.1.0.sif"                                                     # Location validation container
+    config_path = f"/home/{args.run}/Configs"                                                               # Location config files
+    slurm_path = f"/home/{args.run}/Slurm"                                                                  # Location slurm files
+    colabdesign_path = "/home/Colabdesign"                                                                  # Location colabdesign repository
+    diffusion_path = "python3.9 diffuse.py"                                                                 # Call diffuse.py 
+    validation_path = "python3 validate.py"                                                                 # Call validate.py
+
+    # Check configs before submission
+    if not args.skip_preflight:
+        from preflight import run_preflight, print_report
+        if print_report(run_preflight(glob.glob(f"{config_path}/*.yml"), root=colabdesign_path)) > 0:
+            exit("Preflight failed, no jobs submitted (use --skip_preflight to submit anyway)")
+
+    # Run diffusion and validation
+    if not os.path.exists(f"{slurm_path}/Diffusion"):
+       os.makedirs(f"{slurm_path}/Diffusion")
+       os.makedirs(f"{slurm_path}/Validation")
+    excludeNodes = ",".join(get_excluded_nodes(load_node_stats(f"{slurm_path}/node_stats.json")))         # Known bad nodes
+    if args.quota > 0:
+        run_quota(colabdesign_path=colabdesign_path, config_path=config_path, slurm_path=slurm_path,
+                  diffusion_container=diffusion_container, validation_container=validation_container,
+                  diffusion_path=diffusion_path, validation_path=validation_path, quota=args.quota,
+                  chunk_size=args.chunk_size, max_designs=args.max_designs, parallel=args.parallel, max_rmsd=args.max_rmsd,
+                  min_plddt=args.min_plddt, max_pae=args.max_pae, excludeNodes=excludeNodes)
+        exit()
+    if args.pack > 1 or args.array:
+        job_ids, errors = run_workflow(colabdesign_path=colabdesign_path, config_path=config_path, slurm_path=slurm_path,
+                                       diffusion_container=diffusion_container, validation_container=validation_container,
+                                       diffusion_path=diffusion_path, validation_path=validation_path,
+                                       pack=args.pack, array=args.array, throttle=args.throttle,
+                                       excludeNodes=excludeNodes)
+        print("Diffusion and validation jobs submitted")
+        exit()
+    diffusion_job_ids, diffusion_errors = run_diffusion(colabdesign_path=colabdesign_path, 
+                                                        config_path=config_path,
+                                                        slurm_path=f"{slurm_path}/Diffusion",
+                                                        container=diffusion_container,
+                                                        diffusion_path=diffusion_path,
+                                                        excludeNodes=excludeNodes)
+    print("Diffusion jobs submitted")
+
+    validation_job_ids, validation_errors = run_validation(colabdesign_path=colabdesign_path,
+                                                           config_path=config_path,
+                                                           slurm_path=f"{slurm_path}/Validation",
+                                                           diffusion_job_ids=diffusion_job_ids,
+                                                           container=validation_container,
+                                                           validation_path=validation_path,
+                                                           excludeNodes=excludeNodes)
+    print("Validation jobs submitted")
+
+    # Watch jobs and resubmit jobs which failed on bad nodes
+    if args.supervise:
+        supervise(colabdesign_path=colabdesign_path, config_path=config_path, slurm_path=slurm_path,
+                  diffusion_job_ids=diffusion_job_ids, validation_job_ids=validation_job_ids,
+                  diffusion_container=diffusion_container, validation_container=validation_container,
+                  diffusion_path=diffusion_path, validation_path=validation_path)
@@ -0,0 +1,75 @@
+# Packages
+import numpy as np
+
+"""
+Vectorized sequence prefilter for ProteinMPNN sequences of one backbone (all sequences have the same length)
+Rules (0 disables a rule):
+max_score               # Max MPNN score (lower is better)
+max_aa_fraction         # Max fraction of a single amino acid
+max_repeat              # Max length of homopolymer runs (e.g. 5: AAAAAA is rejected)
+min_entropy             # Min Shannon entropy (bits) in every window of entropy_window residues (low complexity)
+entropy_window          # Window size for low complexity rule, default 12
+max_hydrophobic_run     # Max number of consecutive hydrophobic residues (AILMFVW)
+top_k                   # Keep the k best passing sequences by MPNN score
+"""
+
+amino_acids = "ACDEFGHIKLMNPQRSTVWY"
+hydrophobic = "AILMFVW"
+lookup = np.full(256, len(amino_acids), dtype=np.int64)
+lookup[np.frombuffer(amino_acids.encode(), dtype=np.uint8)] = np.arange(len(amino_acids))
+
+# One-hot encode sequences, returns array (sequences, length, 20), unknown residues are zero
+def encode(seqs:list):
+    length = len(seqs[0])
+    idx = lookup[np.frombuffer("".join(seqs).encode(), dtype=np.uint8)].reshape(len(seqs), length)
+    return np.eye(len(amino_acids) + 1, dtype=np.int32)[idx][..., :len(amino_acids)]
+
+# Counts in sliding windows of size w, returns array (sequences, windows, channels)
+def window_counts(x, w:int):
+    w = min(w, x.shape[1])
+    c = np.concatenate([np.zeros_like(x[:, :1]), np.cumsum(x, axis=1)], axis=1)
+    return c[:, w:] - c[:, :-w]
+
+# Filter sequences, returns indices of passing sequences and reason for every sequence ("" if passed)
+# Reasons are "; " separated and start with the rule name, e.g. "max_score: mpnn score 1.612 > 1.5"
+def filter_sequences(seqs:list, scores, max_score:float=0, max_aa_fraction:float=0, max_repeat:int=0,
+                     min_entropy:float=0, entropy_window:int=12, max_hydrophobic_run:int=0, top_k:int=0):
+    scores = np.asarray(scores, dtype=float)
+    reasons = [[] for _ in seqs]
+    if len(seqs) == 0:
+        return [], []
+    onehot = encode(seqs)
+    length = onehot.shape[1]
+
+    def reject(mask, message):
+        for i in np.where(mask)[0]:
+            reasons[i].append(message(i))
+
+    if max_score > 0:
+        reject(scores > max_score, lambda i: f"max_score: mpnn score {scores[i]:.3f} > {max_score}")
+    if max_aa_fraction > 0:
+        fraction = onehot.sum(1) / length
+        aa = fraction.argmax(-1)
+        reject(fraction.max(-1) > max_aa_fraction,
+               lambda i: f"max_aa_fraction: {amino_acids[aa[i]]} fraction {fraction[i, aa[i]]:.2f} > {max_aa_fraction}")
+    if max_repeat > 0 and length > max_repeat:
+        counts = window_counts(onehot, max_repeat + 1).max(1)
+        aa = counts.argmax(-1)
+        reject(counts.max(-1) > max_repeat, lambda i: f"max_repeat: {amino_acids[aa[i]]} repeat > {max_repeat}")
+    if min_entropy > 0:
+        p = window_counts(onehot, entropy_window) / min(entropy_window, length)
+        entropy = -(p * np.log2(np.where(p > 0, p, 1))).sum(-1).min(-1)
+        reject(entropy < min_entropy, lambda i: f"min_entropy: low complexity (entropy {entropy[i]:.2f} < {min_entropy})")
+    if max_hydrophobic_run > 0 and length > max_hydrophobic_run:
+        hydro = onehot[..., [amino_acids.index(aa) for aa in hydrophobic]].sum(-1, keepdims=True)
+        run = window_counts(hydro, max_hydrophobic_run + 1).max((1, 2))
+        reject(run > max_hydrophobic_run, lambda i: f"max_hydrophobic_run: hydrophobic patch > {max_hydrophobic_run}")
+
+    # Rank passing sequences by MPNN score
+    passed = [i for i in range(len(seqs)) if len(reasons[i]) == 0]
+    if top_k > 0:
+        ranked = sorted(passed, key=lambda i: scores[i])
+        for rank,i in enumerate(ranked[top_k:]):
+            reasons[i].append(f"top_k: rank {top_k + rank + 1} > {top_k}")
+        passed = sorted(ranked[:top_k])
+    return passed, ["; ".join(r) for r in reasons]
@@ -0,0 +1,202 @@
+"""
+Discrete-event simulation of the diffusion -> validation workflow on N GPUs.
+Slurm scripts are generated with the same code as run_cluster.py (sbatch is replaced by a recorder),
+then the dependency graph is read back from the scripts and replayed with observed or modelled durations.
+"""
+
+# Packages
+import os, re, glob, heapq, argparse, tempfile
+import yaml
+import pandas as pd
+import run_cluster
+
+"""
+Arguments
+--configs, -c, type=str                 # Folder with config files
+--durations, -d, type=str               # Optional csv with observed durations (columns: name, stage, seconds)
+--policies, type=str                    # Comma separated policies (jobs, array, pack), default jobs,array,pack
+--gpus, type=int                        # Number of GPUs, default 4
+--pack, type=int                        # Configs per job for pack policy, default 4
+--throttle, type=int                    # Max running array tasks (array policy only, as in run_cluster.py), 0 = unlimited
+--job_overhead, type=float              # Seconds per job for scheduling and container start, default 60
+--diffusion_cost, type=float            # Cost model: seconds per residue and design (50 diffusion steps), default 0.1
+--validation_cost, type=float           # Cost model: seconds per residue, sequence and recycle, default 0.005
+"""
+
+# Get protein length of a contig string
+def get_length(contigs:str):
+    length = 0
+    for section in contigs.replace(" ", "/").replace(":", "/").split("/"):
+        if len(section) == 0 or section == "0":
+            continue
+        a, b = section.split("-")
+        if a[0].isalpha():
+            length += int(b) - int(a[1:]) + 1
+        else:
+            length += int(b)
+    return length
+
+# Get durations of each config and stage from observed durations or cost model, configs are keyed by normalized path
+def get_durations(config_files:list, observed, diffusion_cost:float, validation_cost:float):
+    durations = {}
+    for config_file in config_files:
+        name = config_file.split('/')[-1].split('.')[0]
+        args = yaml.safe_load(open(config_file))
+        length = get_length(args["diffusion"]["contigs"])
+        num_designs = args["diffusion"]["num_designs"]
+        iterations = args["diffusion"].get("iterations", 50)
+        num_seqs = args["validation"]["num_seqs"]
+        num_recycles = args["validation"].get("num_recycles", 3)
+        key = os.path.normpath(config_file)
+        durations[(key, "diffusion")] = diffusion_cost * length * num_designs * iterations / 50
+        durations[(key, "validation")] = validation_cost * length * num_designs * num_seqs * (num_recycles + 1)
+        if observed is not None:
+            for stage in ["diffusion", "validation"]:
+                rows = observed[(observed["name"] == name) & (observed["stage"] == stage)]
+                if len(rows) > 0:
+                    durations[(key, stage)] = float(rows["seconds"].mean())
+    return durations
+
+# Generate slurm scripts for a policy with run_cluster, returns submitted scripts in submission order
+def generate_scripts(policy:str, config_path:str, slurm_path:str, pack:int, throttle:int):
+    submitted = []
+    def run_slurm_script(name, cwd):
+        job_id = str(len(submitted) + 1)
+        submitted.append((job_id, f"{cwd}/{name}.slurm"))
+        return job_id, ''
+    original = run_cluster.run_slurm_script
+    run_cluster.run_slurm_script = run_slurm_script
+    try:
+        for folder in ["Diffusion", "Validation"]:
+            os.makedirs(f"{slurm_path}/{folder}", exist_ok=True)
+        paths = dict(colabdesign_path=".", diffusion_container="diffusion.sif", validation_container="validation.sif",
+                     diffusion_path="python3.9 diffuse.py", validation_path="python3 validate.py")
+        if policy == "jobs":
+            diffusion_job_ids, _ = run_cluster.run_diffusion(colabdesign_path=".", config_path=config_path,
+                                                             slurm_path=f"{slurm_path}/Diffusion",
+                                                             container=paths["diffusion_container"],
+                                                             diffusion_path=paths["diffusion_path"])
+            run_cluster.run_validation(colabdesign_path=".", config_path=config_path, slurm_path=f"{slurm_path}/Validation",
+                                       diffusion_job_ids=diffusion_job_ids, container=paths["validation_container"],
+                                       validation_path=paths["validation_path"])
+        elif policy == "array":
+            run_cluster.run_workflow(config_path=config_path, slurm_path=slurm_path, array=True, throttle=throttle, **paths)
+        elif policy == "pack":
+            run_cluster.run_workflow(config_path=config_path, slurm_path=slurm_path, pack=pack, **paths)
+        else:
+            raise Exception(f"Unknown policy {policy}")
+    finally:
+        run_cluster.run_slurm_script = original
+    return submitted
+
+# Read job from slurm script, returns stage, dependency, array throttle and configs of each task
+def parse_slurm_script(path:str):
+    with open(path) as handle:
+        text = handle.read()
+    stage = "diffusion" if "diffuse.py" in text else "validation"
+    dependency = re.search(r"#SBATCH --dependency=(\w+):(\S+)", text)
+    array = re.search(r"#SBATCH --array=(\d+)-(\d+)(?:%(\d+))?", text)
+    single = re.search(r'SCRIPT=".* --config (\S+)"', text)
+    if single is not None:
+        tasks = [[single.group(1)]]
+    elif array is not None:
+        tasks = [x.split() for x in re.findall(r'"([^"]*)"', re.search(r"TASKS=\((.*)\)", text).group(1))]
+    else:
+        tasks = [re.search(r'CONFIGS="(.*)"', text).group(1).split()]
+    return {"stage":stage,
+            "dependency":None if dependency is None else (dependency.group(1), dependency.group(2)),
+            "throttle":0 if array is None or array.group(3) is None else int(array.group(3)),
+            "tasks":tasks}
+
+# Replay submitted jobs on gpus, returns makespan, gpu utilization and queue waits
+def simulate(submitted:list, durations:dict, gpus:int, job_overhead:float):
+    # Build tasks (one per job or array task)
+    tasks = []
+    jobs = {}
+    for job_id, path in submitted:
+        job = parse_slurm_script(path)
+        jobs[job_id] = job
+        job["task_ids"] = []
+        for index, configs in enumerate(job["tasks"]):
+            duration = job_overhead + sum([durations[(os.path.normpath(config), job["stage"])] for config in configs])
+            job["task_ids"].append(len(tasks))
+            tasks.append({"job":job_id, "index":index, "duration":duration, "deps":[]})
+    for task in tasks:
+        job = jobs[task["job"]]
+        if job["dependency"] is not None:
+            kind, dep_id = job["dependency"]
+            if kind == "aftercorr":
+                task["deps"] = [jobs[dep_id]["task_ids"][task["index"]]]
+            else:
+                task["deps"] = list(jobs[dep_id]["task_ids"])
+
+    # Event loop, tasks are started in submission order, blocked tasks (dependencies, array throttle) are skipped
+    # and later eligible tasks start on free gpus (backfill)
+    finished = {}
+    running = []
+    running_per_job = {}
+    pending = list(range(len(tasks)))
+    waits = []
+    busy = 0.0
+    now = 0.0
+    while len(pending) > 0 or len(running) > 0:
+        started = True
+        while started:
+            started = False
+            for t in pending:
+                task = tasks[t]
+                if len(running) >= gpus:
+                    break
+                if any([d not in finished for d in task["deps"]]):
+                    continue
+                job_throttle = jobs[task["job"]]["throttle"]
+                if job_throttle > 0 and running_per_job.get(task["job"], 0) >= job_throttle:
+                    continue
+                eligible = max([finished[d] for d in task["deps"]] + [0.0])
+                waits.append(now - eligible)
+                busy += task["duration"]
+                heapq.heappush(running, (now + task["duration"], t))
+                running_per_job[task["job"]] = running_per_job.get(task["job"], 0) + 1
+                pending.remove(t)
+                started = True
+                break
+        if len(running) == 0:
+            raise Exception("Deadlock in dependency graph")
+        now, t = heapq.heappop(running)
+        finished[t] = now
+        running_per_job[tasks[t]["job"]] -= 1
+    makespan = now
+    return {"jobs":len(submitted),
+            "tasks":len(tasks),
+            "makespan_h":makespan / 3600,
+            "gpu_utilization":busy / (gpus * makespan) if makespan > 0 else 0.0,
+            "mean_wait_h":sum(waits) / len(waits) / 3600 if len(waits) > 0 else 0.0,
+            "max_wait_h":max(waits) / 3600 if len(waits) > 0 else 0.0}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--configs", "-c", type=str, required=True)
+    parser.add_argument("--durations", "-d", type=str, default="")
+    parser.add_argument("--policies", type=str, default="jobs,array,pack")
+    parser.add_argument("--gpus", type=int, default=4)
+    parser.add_argument("--pack", type=int, default=4)
+    parser.add_argument("--throttle", type=int, default=0)
+    parser.add_argument("--job_overhead", type=float, default=60)
+    parser.add_argument("--diffusion_cost", type=float, default=0.1)
+    parser.add_argument("--validation_cost", type=float, default=0.005)
+    args = parser.parse_args()
+
+    config_files = sorted(glob.glob(f"{args.configs}/*.yml"))
+    observed = pd.read_csv(args.durations) if args.durations != "" else None
+    durations = get_durations(config_files, observed, args.diffusion_cost, args.validation_cost)
+
+    results = {}
+    for policy in args.policies.split(","):
+        # run_cluster.py only throttles job arrays (%N in the script)
+        if args.throttle > 0 and policy != "array":
+            print(f"--throttle is ignored for policy {policy}, run_cluster.py only throttles arrays")
+        with tempfile.TemporaryDirectory() as slurm_path:
+            submitted = generate_scripts(policy, args.configs, slurm_path, args.pack, args.throttle)
+            results[policy] = simulate(submitted, durations, args.gpus, args.job_overhead)
+    print(pd.DataFrame(results).T.to_string(float_format=lambda x: f"{x:.3f}"))
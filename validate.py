@@ -3,41 +3,55 @@ import sys, random, string, re, os
 import yaml
 import argparse
 import time
+from designability_test import DesignabilityOptions, run_designability
 
 # Check if AlphaFold parameters are downloaded
 # if not os.path.isfile("params/done.txt"):
 #    raise Exception("AlphaFold parameters not found...")
 
-# Read config file
-parser = argparse.ArgumentParser()
-parser.add_argument('--config', type=str, required=True)
-args = parser.parse_args()
-args = yaml.safe_load(open(args.config))
-args_validation = args["validation"]
-contigs_str = args["diffusion"]["contigs"]
-print(contigs_str)
+# Get designability options of a config file
+def get_options(config:str):
+    args = yaml.safe_load(open(config))
+    args_validation = args["validation"]
+    contigs_str = args_validation.get("contigs", args["diffusion"]["contigs"])    # Contigs of parent design for refined designs
+    print(contigs_str)
 
-num_seqs = args_validation["num_seqs"]
-num_recycles = args_validation["num_recycles"]
-rm_aa = args_validation["rm_aa"]
-num_designs = args["diffusion"]["num_designs"]
-path = args["diffusion"]["path"]
-name = args["diffusion"]["name"]
-full_path = f"{path}{name}"
+    num_seqs = args_validation["num_seqs"]
+    num_recycles = args_validation["num_recycles"]
+    rm_aa = args_validation["rm_aa"]
+    num_designs = args["diffusion"]["num_designs"]
+    path = args["diffusion"]["path"]
+    name = args["diffusion"]["name"]
+    full_path = f"{path}{name}"
 
-opts = [f"--pdb={full_path}/Diffusion/{name}_0.pdb",
-        f"--loc={full_path}/Validation",
-        f"--contig={contigs_str}",
-        f"--copies=1",
-        f"--num_seqs={num_seqs}",
-        f"--num_recycles={num_recycles}",
-        f"--rm_aa={rm_aa}",
-        f"--num_designs={num_designs}"]
-if args_validation["initial_guess"]: opts.append("--initial_guess")
-if args_validation["use_multimer"]: opts.append("--use_multimer")
-opts = ' '.join(opts)
+    options = {"pdb":f"{full_path}/Diffusion/{name}_0.pdb",
+               "loc":f"{full_path}/Validation",
+               "contigs":contigs_str,
+               "copies":1,
+               "num_seqs":num_seqs,
+               "num_recycles":num_recycles,
+               "rm_aa":"" if rm_aa is None else str(rm_aa),
+               "num_designs":num_designs,
+               "initial_guess":bool(args_validation["initial_guess"]),
+               "use_multimer":bool(args_validation["use_multimer"])}
+    for key in ["mpnn_sampling_temp", "mpnn_sampling_temps", "models", "workers", "jax_cache", "save_confidence", "use_soluble"]:
+        if key in args_validation: options[key] = args_validation[key]
+    for key,value in (args_validation.get("prefilter") or {}).items():                 # Sequence prefilter rules
+        options[f"filter_{key}"] = value
+    return DesignabilityOptions(**options)
 
-# Run validation script (ProteinMPNN + AlphaFold)
-print("running designability...")
-print(f"python3.8 designability_test.py {opts}")
-os.system(f"python3.8 designability_test.py {opts}")
\ No newline at end of file
+
+if __name__ == "__main__":
+    # Read config file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', type=str, required=True)
+    parser.add_argument('--dry_run', action='store_true')     # Print designability options without running
+    args = parser.parse_args()
+    options = get_options(args.config)
+    print(options)
+    if args.dry_run:
+        sys.exit(0)
+
+    # Run validation (ProteinMPNN + AlphaFold) in this process
+    print("running designability...")
+    run_designability(options)